@@ -1,22 +1,26 @@
 import os
+import asyncio
 import logging
 import re
 import tempfile
-import random
 from datetime import datetime, timedelta
-from typing import Optional, List
-from html import unescape
+from typing import Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
 import firebase_admin
 from firebase_admin import credentials, auth as firebase_auth
-import praw
 
-from pipeline import deepfakes_video_predict, deepfakes_image_predict, deepfakes_audio_predict
+import thread_budget
+import profiling
+from feed_api import router as feed_router
+from pipeline import (
+    deepfakes_video_predict, deepfakes_image_predict, deepfakes_audio_predict, deepfakes_av_predict,
+    StreamingVideoScorer, cascade_stats, known_media_index,
+)
 
 # ==========================
 # LOGGING
@@ -48,8 +52,16 @@ app.add_middleware(
 # ==========================
 # FIREBASE AUTH SETUP
 # ==========================
-cred = credentials.Certificate("serviceAccountKey.json")  # put your Firebase key here
-firebase_admin.initialize_app(cred)
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "serviceAccountKey.json")  # put your Firebase key here
+if os.path.exists(FIREBASE_CREDENTIALS) or os.getenv("DFG_ALLOW_NO_FIREBASE") != "1":
+    cred = credentials.Certificate(FIREBASE_CREDENTIALS)
+    firebase_admin.initialize_app(cred)
+else:
+    # Explicit opt-in for local testing (loadtest.py sets it and overrides get_current_user).
+    logger.warning(
+        f"Firebase credentials not found at {FIREBASE_CREDENTIALS} and DFG_ALLOW_NO_FIREBASE=1: Firebase is not "
+        "initialized, so every token check fails with 401 and /register fails"
+    )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -85,13 +97,26 @@ async def register_user(email: str = Form(...), password: str = Form(...)):
 # ==========================
 # CURRENT USER FROM FIREBASE TOKEN
 # ==========================
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+# Admins carry an `admin: true` custom claim, or are listed in ADMIN_EMAILS
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+def verify_user_token(token: str) -> dict:
     try:
         decoded_token = firebase_auth.verify_id_token(token)
-        return {"uid": decoded_token["uid"], "email": decoded_token.get("email")}
+        email = decoded_token.get("email")
+        is_admin = bool(decoded_token.get("admin")) or (email or "").lower() in ADMIN_EMAILS
+        return {"uid": decoded_token["uid"], "email": email, "admin": is_admin}
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid Firebase token")
 
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return verify_user_token(token)
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if not current_user.get("admin"):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
+
 # ==========================
 # FILE VALIDATION
 # ==========================
@@ -118,11 +143,25 @@ def save_upload_file_temp(upload_file: UploadFile) -> str:
 # PREDICTION ENDPOINTS
 # ==========================
 @app.post("/predict/video")
-async def predict_video(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+async def predict_video(
+    file: UploadFile = File(...),
+    with_audio: bool = Query(False, description="Also score the audio track and fuse both verdicts"),
+    current_user: dict = Depends(get_current_user),
+):
     if not validate_file_extension(file.filename, VALID_VIDEO_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Invalid file format. Only .mp4, .avi, .mov, .mkv are supported.")
     file_path = save_upload_file_temp(file)
     try:
+        if with_audio:
+            # Both branches block on the models; keep them off the event loop.
+            result = await run_in_threadpool(deepfakes_av_predict, file_path)
+            return {
+                "isDeepfake": result["result"] == "FAKE",
+                "label": result["result"],
+                "confidence": result["confidence"],
+                "video": result["video"],
+                "audio": result["audio"],
+            }
         result = deepfakes_video_predict(file_path)
         return {"isDeepfake": "FAKE" in result, "label": result, "confidence": None}
     finally:
@@ -170,86 +209,113 @@ async def predict_audio(file: UploadFile = File(...), current_user: dict = Depen
         os.unlink(file_path)
 
 # ==========================
-# ROOT
+# LIVE VIDEO STREAM
 # ==========================
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to Deepfake Guard API. Use /predict/video, /predict/image, or /predict/audio endpoints."}
+# Clients send each frame as a binary message (JPEG/PNG bytes) and a text
+# message "end" when the stream stops. A rolling verdict is pushed back after
+# every `window` sampled frames. Browsers can't set headers on WebSockets, and
+# query strings end up in access logs, so the Firebase token is sent as the
+# first text message after the connection opens.
+WS_AUTH_TIMEOUT = 10  # seconds to wait for the token message
+
+@app.websocket("/ws/predict/video")
+async def predict_video_stream(
+    websocket: WebSocket,
+    sample_every: int = Query(5, ge=1, le=300),
+    window: int = Query(5, ge=1, le=100),
+):
+    await websocket.accept()
+    try:
+        token = await asyncio.wait_for(websocket.receive_text(), timeout=WS_AUTH_TIMEOUT)
+        await run_in_threadpool(verify_user_token, token)
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, HTTPException, KeyError):
+        await websocket.close(code=1008)
+        return
+    scorer = StreamingVideoScorer(sample_every=sample_every, window=window)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                verdict = await run_in_threadpool(scorer.push, message["bytes"])
+            elif message.get("text") == "end":
+                verdict = await run_in_threadpool(scorer.flush)
+                if verdict:
+                    await websocket.send_json(verdict)
+                await websocket.close()
+                break
+            else:
+                continue
+            if verdict:
+                await websocket.send_json(verdict)
+    except WebSocketDisconnect:
+        pass
+    except ValueError as e:
+        logger.error(f"Live video stream error: {str(e)}")
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1003)
+    except Exception as e:
+        logger.exception(f"Live video scoring failed: {str(e)}")
+        await websocket.send_json({"error": f"Scoring failed: {str(e)}"})
+        await websocket.close(code=1011)
 
 # ==========================
-# REDDIT FEED API
+# DIAGNOSTICS
 # ==========================
-class MediaItem(BaseModel):
-    title: str
-    url: str
-    media_type: str  # "image" or "video"
+@app.get("/diagnostics/threads")
+def thread_diagnostics(current_user: dict = Depends(get_current_user)):
+    return thread_budget.effective_settings()
 
-IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif")
-GIFV_EXT = ".gifv"
+@app.get("/diagnostics/cascade")
+def cascade_diagnostics(current_user: dict = Depends(get_current_user)):
+    return cascade_stats()
 
-reddit = praw.Reddit(
-    client_id="rdfzsMrvduHRgGLNcaM4PQ",
-    client_secret="ToEDt-fgwDCbGIh_fztoMa30TuUdpQ",
-    user_agent="DeepfakeFeedApp/0.1 by DeepfakeGuard"
-)
-
-def convert_imgur_gifv(url: str) -> str:
-    return url.replace(".gifv", ".mp4") if GIFV_EXT in url else url
+# ==========================
+# ADMIN PROFILING
+# ==========================
+PROFILE_TARGETS = {
+    "video": (VALID_VIDEO_EXTENSIONS, deepfakes_video_predict),
+    "image": (VALID_IMAGE_EXTENSIONS, deepfakes_image_predict),
+    "audio": (VALID_AUDIO_EXTENSIONS, deepfakes_audio_predict),
+}
 
-def convert_gfycat(url: str) -> str:
-    name = url.rstrip("/").split("/")[-1]
-    return f"https://giant.gfycat.com/{name}.mp4"
+@app.post("/admin/profile/{modality}")
+async def profile_prediction(modality: str, file: UploadFile = File(...), admin_user: dict = Depends(get_admin_user)):
+    if modality not in PROFILE_TARGETS:
+        raise HTTPException(status_code=404, detail="Unknown modality. Use video, image or audio.")
+    valid_extensions, predict_fn = PROFILE_TARGETS[modality]
+    if not validate_file_extension(file.filename, valid_extensions):
+        raise HTTPException(status_code=400, detail=f"Invalid file format for {modality}.")
+    file_path = save_upload_file_temp(file)
+    try:
+        logger.info(f"Profiling {modality} prediction for {admin_user['email']}: {file.filename}")
+        return await run_in_threadpool(profiling.profile_prediction, modality, predict_fn, file_path)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    finally:
+        os.unlink(file_path)
 
-def unescape_url(u: str) -> str:
-    return unescape(u).replace("&amp;", "&").strip() if u else ""
+# ==========================
+# SHUTDOWN
+# ==========================
+# serve.py workers leave through os._exit, which skips atexit handlers, so
+# unsaved near-duplicate verdicts are written out here.
+@app.on_event("shutdown")
+def save_known_media():
+    if known_media_index is not None:
+        known_media_index.save()
 
-@app.get("/feed", response_model=List[MediaItem])
-def get_feed(subreddit: str = "pics", limit: int = 10, sort: str = Query("hot", regex="^(hot|new|top)$")):
-    try:
-        subreddit_obj = reddit.subreddit(subreddit)
-        fetch_limit = max(limit * 3, 25)
-        if sort == "new":
-            submissions = list(subreddit_obj.new(limit=fetch_limit))
-        elif sort == "top":
-            submissions = list(subreddit_obj.top(limit=fetch_limit))
-        else:
-            submissions = list(subreddit_obj.hot(limit=fetch_limit))
-
-        posts = []
-        for submission in submissions:
-            title, url, lower = submission.title, submission.url, submission.url.lower()
-            if getattr(submission, "is_video", False):
-                try:
-                    video_url = submission.media["reddit_video"]["fallback_url"]
-                    posts.append({"title": title, "url": video_url, "media_type": "video"})
-                    continue
-                except:
-                    pass
-            if any(lower.endswith(ext) for ext in IMAGE_EXTS):
-                posts.append({"title": title, "url": url, "media_type": "image"})
-                continue
-            if ".gifv" in lower and "imgur.com" in lower:
-                posts.append({"title": title, "url": convert_imgur_gifv(url), "media_type": "video"})
-                continue
-            if "gfycat.com" in lower:
-                posts.append({"title": title, "url": convert_gfycat(url), "media_type": "video"})
-                continue
-            if any(host in lower for host in ("youtube.com", "youtu.be", "vimeo.com", "redgifs.com")):
-                posts.append({"title": title, "url": url, "media_type": "video"})
-                continue
-            try:
-                if getattr(submission, "is_gallery", False):
-                    meta = getattr(submission, "media_metadata", {}) or {}
-                    for v in meta.values():
-                        src = v.get("s") or v.get("p", [{}])[-1]
-                        img_url = src.get("u") if src else None
-                        if img_url:
-                            posts.append({"title": title, "url": unescape_url(img_url), "media_type": "image"})
-            except Exception:
-                pass
-
-        random.shuffle(posts)
-        return posts[:limit]
+# ==========================
+# ROOT
+# ==========================
+@app.get("/")
+def read_root():
+    return {"message": "Welcome to Deepfake Guard API. Use /predict/video, /predict/image, or /predict/audio endpoints."}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# ==========================
+# REDDIT FEED API
+# ==========================
+app.include_router(feed_router)
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import thread_budget
+
+# ==========================
+# THREAD BUDGET BENCHMARK
+# ==========================
+# Measures prediction throughput for several per-worker thread budgets. Each
+# budget runs in a fresh process, because BLAS and framework pools can only
+# be sized before they start.
+
+
+def run_child(args):
+    import pipeline
+
+    predict = {
+        "video": pipeline.deepfakes_video_predict,
+        "image": pipeline.deepfakes_image_predict,
+        "audio": pipeline.deepfakes_audio_predict,
+    }[args.modality]
+    predict(args.file)  # warm-up
+
+    latencies = []
+
+    def one_request(_):
+        started = time.perf_counter()
+        predict(args.file)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(json.dumps({
+        "settings": pipeline.thread_budget.effective_settings(),
+        "throughput": args.requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prediction throughput across CPU thread budgets.")
+    parser.add_argument("file", help="Media file to score repeatedly.")
+    parser.add_argument("--modality", choices=("video", "image", "audio"), default="image")
+    parser.add_argument("--budgets", default="1,2,4,0",
+                        help="Comma-separated threads per worker; 0 runs with the budget turned off (framework defaults).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests within the worker.")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    print(f"{'budget':>8} {'torch':>6} {'tf':>4} {'cv2':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for budget in [int(b) for b in args.budgets.split(",")]:
+        # Drop inherited BLAS settings so each run sees only its own budget;
+        # DFG_THREADS=0 leaves every pool at its unmanaged default.
+        env = {name: value for name, value in os.environ.items() if name not in thread_budget.BLAS_ENV_VARS}
+        env["DFG_THREADS"] = str(budget)
+        command = [sys.executable, __file__, args.file, "--child", "--modality", args.modality,
+                   "--concurrency", str(args.concurrency), "--requests", str(args.requests)]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{budget:>8} failed: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        settings = result["settings"]
+        print(
+            f"{budget or 'default':>8} {settings.get('torch', {}).get('intra_op', '-'):>6} "
+            f"{settings.get('tensorflow', {}).get('intra_op', '-'):>4} {settings.get('opencv', {}).get('threads', '-'):>4} "
+            f"{result['throughput']:>8.2f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
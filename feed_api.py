@@ -1,12 +1,14 @@
 # feed_api.py
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from html import unescape
 import praw
 import random
 import os
 
+from feed_scorer import FeedPrescorer, SharedFeedVerdicts
+
 router = APIRouter()
 
 # Reddit credentials (use environment variables or defaults)
@@ -26,6 +28,10 @@ class MediaItem(BaseModel):
     title: str
     url: str
     media_type: str  # "image" or "video"
+    # Filled in when background pre-scoring is enabled
+    status: Optional[str] = None  # "pending", "scored", "failed" or "unsupported"
+    isDeepfake: Optional[bool] = None
+    confidence: Optional[float] = None
 
 # Helpers
 IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif")
@@ -41,6 +47,99 @@ def convert_gfycat(url: str) -> str:
     name = url.rstrip("/").split("/")[-1]
     return f"https://giant.gfycat.com/{name}.mp4"
 
+def fetch_submissions(subreddit: str, sort: str, fetch_limit: int):
+    subreddit_obj = reddit.subreddit(subreddit)
+    if sort == "new":
+        return list(subreddit_obj.new(limit=fetch_limit))
+    elif sort == "top":
+        return list(subreddit_obj.top(limit=fetch_limit))
+    else:
+        return list(subreddit_obj.hot(limit=fetch_limit))
+
+def extract_posts(submissions) -> List[dict]:
+    posts = []
+
+    for submission in submissions:
+        title = submission.title
+        url = submission.url
+        lower = url.lower()
+
+        # Reddit-hosted video
+        if getattr(submission, "is_video", False):
+            try:
+                video_url = submission.media["reddit_video"]["fallback_url"]
+                posts.append({"title": title, "url": video_url, "media_type": "video"})
+                continue
+            except:
+                pass
+
+        # Direct images
+        if any(lower.endswith(ext) for ext in IMAGE_EXTS):
+            posts.append({"title": title, "url": url, "media_type": "image"})
+            continue
+
+        # Imgur .gifv -> .mp4
+        if ".gifv" in lower and "imgur.com" in lower:
+            posts.append({"title": title, "url": convert_imgur_gifv(url), "media_type": "video"})
+            continue
+
+        # Gfycat -> mp4
+        if "gfycat.com" in lower:
+            posts.append({"title": title, "url": convert_gfycat(url), "media_type": "video"})
+            continue
+
+        # YouTube/Vimeo/Redgifs -> treat as video page
+        if any(host in lower for host in ("youtube.com", "youtu.be", "vimeo.com", "redgifs.com")):
+            posts.append({"title": title, "url": url, "media_type": "video"})
+            continue
+
+        # Reddit gallery / preview thumbnail
+        try:
+            if getattr(submission, "is_gallery", False):
+                meta = getattr(submission, "media_metadata", {}) or {}
+                for v in meta.values():
+                    src = v.get("s") or v.get("p", [{}])[-1]
+                    img_url = src.get("u") if src else None
+                    if img_url:
+                        posts.append({"title": title, "url": unescape_url(img_url), "media_type": "image"})
+        except Exception:
+            pass
+
+    return posts
+
+# Background pre-scoring (enabled by listing subreddits in FEED_PRESCORE_SUBREDDITS)
+PRESCORE_SUBREDDITS = [s.strip() for s in os.getenv("FEED_PRESCORE_SUBREDDITS", "").split(",") if s.strip()]
+PRESCORE_INTERVAL = float(os.getenv("FEED_PRESCORE_INTERVAL", "300"))
+PRESCORE_LIMIT = int(os.getenv("FEED_PRESCORE_LIMIT", "25"))
+PRESCORE_QUEUE = int(os.getenv("FEED_PRESCORE_QUEUE", "500"))
+PRESCORE_STORE = os.getenv("FEED_PRESCORE_STORE")
+
+# Under serve.py only worker 0 scores; the others annotate from its store
+WORKER_INDEX = os.getenv("DFG_WORKER_INDEX", "0")
+
+if not PRESCORE_SUBREDDITS:
+    prescorer = None
+elif WORKER_INDEX != "0" and PRESCORE_STORE:
+    prescorer = SharedFeedVerdicts(PRESCORE_STORE)
+else:
+    prescorer = FeedPrescorer(
+        fetch_posts=lambda subreddit: extract_posts(fetch_submissions(subreddit, "hot", PRESCORE_LIMIT)),
+        subreddits=PRESCORE_SUBREDDITS,
+        interval=PRESCORE_INTERVAL,
+        max_queue=PRESCORE_QUEUE,
+        store_dir=PRESCORE_STORE,
+    )
+
+@router.on_event("startup")
+def start_prescorer():
+    if prescorer is not None:
+        prescorer.start()
+
+@router.on_event("shutdown")
+def stop_prescorer():
+    if prescorer is not None:
+        prescorer.stop()
+
 # Feed endpoint
 @router.get("/feed", response_model=List[MediaItem])
 def get_feed(
@@ -49,66 +148,15 @@ def get_feed(
     sort: str = Query("hot", regex="^(hot|new|top)$")
 ):
     try:
-        subreddit_obj = reddit.subreddit(subreddit)
         fetch_limit = max(limit * 3, 25)  # fetch extra for randomization
-
-        if sort == "new":
-            submissions = list(subreddit_obj.new(limit=fetch_limit))
-        elif sort == "top":
-            submissions = list(subreddit_obj.top(limit=fetch_limit))
-        else:
-            submissions = list(subreddit_obj.hot(limit=fetch_limit))
-
-        posts = []
-
-        for submission in submissions:
-            title = submission.title
-            url = submission.url
-            lower = url.lower()
-
-            # Reddit-hosted video
-            if getattr(submission, "is_video", False):
-                try:
-                    video_url = submission.media["reddit_video"]["fallback_url"]
-                    posts.append({"title": title, "url": video_url, "media_type": "video"})
-                    continue
-                except:
-                    pass
-
-            # Direct images
-            if any(lower.endswith(ext) for ext in IMAGE_EXTS):
-                posts.append({"title": title, "url": url, "media_type": "image"})
-                continue
-
-            # Imgur .gifv -> .mp4
-            if ".gifv" in lower and "imgur.com" in lower:
-                posts.append({"title": title, "url": convert_imgur_gifv(url), "media_type": "video"})
-                continue
-
-            # Gfycat -> mp4
-            if "gfycat.com" in lower:
-                posts.append({"title": title, "url": convert_gfycat(url), "media_type": "video"})
-                continue
-
-            # YouTube/Vimeo/Redgifs -> treat as video page
-            if any(host in lower for host in ("youtube.com", "youtu.be", "vimeo.com", "redgifs.com")):
-                posts.append({"title": title, "url": url, "media_type": "video"})
-                continue
-
-            # Reddit gallery / preview thumbnail
-            try:
-                if getattr(submission, "is_gallery", False):
-                    meta = getattr(submission, "media_metadata", {}) or {}
-                    for v in meta.values():
-                        src = v.get("s") or v.get("p", [{}])[-1]
-                        img_url = src.get("u") if src else None
-                        if img_url:
-                            posts.append({"title": title, "url": unescape_url(img_url), "media_type": "image"})
-            except Exception:
-                pass
+        posts = extract_posts(fetch_submissions(subreddit, sort, fetch_limit))
 
         random.shuffle(posts)  # randomize feed
-        return posts[:limit]
+        posts = posts[:limit]
+        # Only the pre-scored subreddits are annotated; others keep status null
+        if prescorer is not None and subreddit.lower() in {s.lower() for s in PRESCORE_SUBREDDITS}:
+            prescorer.annotate(posts)
+        return posts
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
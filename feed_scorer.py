@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# BACKGROUND FEED PRE-SCORING
+# ==========================
+# A daemon thread periodically pulls the configured subreddits and scores new
+# media through the detection pipelines, so /feed can attach verdicts inline.
+# Items requested through /feed that haven't been seen yet are queued ahead
+# of the periodic refresh. The queue holds at most max_queue posts.
+#
+# Under serve.py only one worker runs the prescorer. It publishes its verdicts
+# to a shared store directory (verdicts.json, replaced whenever a verdict
+# changes), and the other workers annotate from that file through
+# SharedFeedVerdicts. They append posts that have no verdict yet to
+# requests.jsonl, which the prescorer drains into the front of its queue.
+
+SCORABLE_EXTENSIONS = {
+    "image": {".jpg", ".jpeg", ".png"},
+    "video": {".mp4", ".avi", ".mov", ".mkv"},
+}
+
+
+# Feed URLs come from arbitrary Reddit posts, so only these media CDNs are
+# ever downloaded from, over https, including after redirects.
+MEDIA_HOSTS = {"i.redd.it", "v.redd.it", "preview.redd.it", "external-preview.redd.it", "i.imgur.com"}
+
+
+def media_extension(url):
+    return os.path.splitext(urlparse(url).path)[1].lower()
+
+
+def check_media_url(url):
+    parsed = urlparse(url)
+    if parsed.scheme != "https" or (parsed.hostname or "").lower() not in MEDIA_HOSTS:
+        raise ValueError(f"Refusing to download media from {url}")
+
+
+class _MediaRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_media_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_media_opener = urllib.request.build_opener(_MediaRedirectHandler)
+
+
+def download_media(url, max_bytes=100 * 1024 * 1024):
+    """Download a media URL from one of MEDIA_HOSTS to a temporary file and return its path."""
+    check_media_url(url)
+    request = urllib.request.Request(url, headers={"User-Agent": "DeepfakeGuard/1.0"})
+    with _media_opener.open(request, timeout=30) as response:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=media_extension(url)) as temp_file:
+            size = 0
+            while True:
+                block = response.read(1 << 16)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    temp_file.close()
+                    os.unlink(temp_file.name)
+                    raise ValueError(f"Media larger than {max_bytes} bytes: {url}")
+                temp_file.write(block)
+            return temp_file.name
+
+
+def default_score_fns():
+    # Imported lazily so the feed can be served (and tested) without loading the models.
+    from pipeline import deepfakes_image_predict, deepfakes_video_predict
+    return {"image": deepfakes_image_predict, "video": deepfakes_video_predict}
+
+
+def label_confidence(media_type, result):
+    """Return a verdict's confidence as the probability of its label, in percent.
+
+    Video and face-cropped image verdicts already report it that way, but a
+    whole-image verdict reports the fake probability even when it is REAL.
+    """
+    confidence = result.get("confidence")
+    if confidence is None or media_type != "image" or "faces" in result or result["result"] == "FAKE":
+        return confidence
+    return round(100 - confidence, 3)
+
+
+PENDING = {"status": "pending", "isDeepfake": None, "confidence": None}
+
+
+def _verdicts_path(store_dir):
+    return os.path.join(store_dir, "verdicts.json")
+
+
+def _requests_path(store_dir):
+    return os.path.join(store_dir, "requests.jsonl")
+
+
+class FeedPrescorer:
+    def __init__(self, fetch_posts, subreddits, interval=300.0, fetch_media=download_media,
+                 score_fns=None, max_entries=5000, max_queue=500, item_delay=0.5, store_dir=None,
+                 poll_interval=1.0):
+        self.fetch_posts = fetch_posts
+        self.subreddits = list(subreddits)
+        self.interval = interval
+        self.fetch_media = fetch_media
+        self.score_fns = score_fns
+        self.max_entries = max_entries
+        self.max_queue = max_queue
+        self.item_delay = item_delay
+        self.store_dir = store_dir
+        self.poll_interval = poll_interval
+        self.verdicts = OrderedDict()
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        if store_dir is not None:
+            os.makedirs(store_dir, exist_ok=True)
+            self._load_store()
+
+    # --- shared store ---
+
+    def _load_store(self):
+        # Keep what a previous run of this worker scored; pending posts were lost with its queue.
+        try:
+            with open(_verdicts_path(self.store_dir)) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        for url, verdict in stored.items():
+            if verdict["status"] != "pending":
+                self.verdicts[url] = verdict
+
+    def _publish(self):
+        if self.store_dir is None:
+            return
+        with self.lock:
+            snapshot = dict(self.verdicts)
+        path = _verdicts_path(self.store_dir)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def _take_requests(self):
+        """Queue the posts other workers have requested since the last call."""
+        if self.store_dir is None:
+            return
+        try:
+            f = open(_requests_path(self.store_dir), "r+")
+        except FileNotFoundError:
+            return
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            lines = f.readlines()
+            f.truncate(0)
+        posts = []
+        for line in lines:
+            try:
+                posts.append(json.loads(line))
+            except ValueError:
+                continue
+        if posts:
+            self.annotate(posts)
+
+    # --- called from request handlers ---
+
+    def annotate(self, posts):
+        """Attach known verdicts to feed posts in place; unknown posts are queued for scoring."""
+        with self.lock:
+            for post in posts:
+                verdict = self.verdicts.get(post["url"])
+                if verdict is None:
+                    verdict = self._enqueue(post, front=True)
+                post.update(verdict)
+        self.wakeup.set()
+        return posts
+
+    def _enqueue(self, post, front=False):
+        """Queue a post for scoring and return its pending verdict, or None if the queue is full."""
+        if len(self.queue) >= self.max_queue:
+            if not front:
+                return None  # picked up again by a later refresh
+            # Requested items go first; drop the item queued longest ago at the back.
+            dropped = self.queue.pop()
+            self.verdicts.pop(dropped["url"], None)
+        verdict = dict(PENDING)
+        self.verdicts[post["url"]] = verdict
+        while len(self.verdicts) > self.max_entries:
+            self.verdicts.popitem(last=False)
+        if front:
+            self.queue.appendleft(post)
+        else:
+            self.queue.append(post)
+        return verdict
+
+    # --- background worker ---
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="feed-prescorer", daemon=True)
+            self.thread.start()
+            logger.info(f"Feed pre-scoring started for {', '.join(self.subreddits)}")
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def refresh(self):
+        for subreddit in self.subreddits:
+            try:
+                posts = self.fetch_posts(subreddit)
+            except Exception as e:
+                logger.warning(f"Failed to fetch r/{subreddit} for pre-scoring: {str(e)}")
+                continue
+            with self.lock:
+                for post in posts:
+                    if post["url"] not in self.verdicts:
+                        self._enqueue(post)
+        self._publish()
+
+    def score(self, post):
+        media_type = post["media_type"]
+        if media_extension(post["url"]) not in SCORABLE_EXTENSIONS.get(media_type, ()):
+            return {"status": "unsupported", "isDeepfake": None, "confidence": None}
+        if self.score_fns is None:
+            self.score_fns = default_score_fns()
+        path = self.fetch_media(post["url"])
+        try:
+            result = self.score_fns[media_type](path)
+        finally:
+            os.unlink(path)
+        return {"status": "scored", "isDeepfake": result["result"] == "FAKE",
+                "confidence": label_confidence(media_type, result)}
+
+    def _run(self):
+        # Lower this thread's scheduling priority (per-thread on Linux) so
+        # pre-scoring yields to request handlers.
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        next_refresh = 0.0
+        while not self.stopping.is_set():
+            if time.monotonic() >= next_refresh:
+                self.refresh()
+                next_refresh = time.monotonic() + self.interval
+            self._take_requests()
+            with self.lock:
+                post = self.queue.popleft() if self.queue else None
+            if post is None:
+                timeout = max(next_refresh - time.monotonic(), 0)
+                if self.store_dir is not None:
+                    timeout = min(timeout, self.poll_interval)  # check requests.jsonl regularly
+                self.wakeup.wait(timeout)
+                self.wakeup.clear()
+                continue
+            try:
+                verdict = self.score(post)
+            except Exception as e:
+                logger.warning(f"Pre-scoring failed for {post['url']}: {str(e)}")
+                verdict = {"status": "failed", "isDeepfake": None, "confidence": None}
+            with self.lock:
+                if post["url"] in self.verdicts:
+                    self.verdicts[post["url"]] = verdict
+            self._publish()
+            self.stopping.wait(self.item_delay)
+
+
+class SharedFeedVerdicts:
+    """Annotates feed posts from the store of a FeedPrescorer running in another worker."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.verdicts = {}
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+
+    def _reload(self):
+        path = _verdicts_path(self.store_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if mtime != self.loaded_mtime:
+                with open(path) as f:
+                    self.verdicts = json.load(f)
+                self.loaded_mtime = mtime
+        except FileNotFoundError:
+            pass  # the prescorer has not published anything yet
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read feed verdicts from {path}: {str(e)}")
+
+    def annotate(self, posts):
+        """Attach published verdicts to feed posts in place; unknown posts are requested from the prescorer."""
+        missing = []
+        with self.lock:
+            self._reload()
+            for post in posts:
+                verdict = self.verdicts.get(post["url"])
+                if verdict is None:
+                    missing.append({"title": post["title"], "url": post["url"], "media_type": post["media_type"]})
+                    verdict = PENDING
+                post.update(verdict)
+        if missing:
+            os.makedirs(self.store_dir, exist_ok=True)
+            with open(_requests_path(self.store_dir), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.write("".join(json.dumps(post) + "\n" for post in missing))
+        return posts
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,62 @@
+import struct
+
+import cv2
+
+# ==========================
+# REDUCED-RESOLUTION DECODING
+# ==========================
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 scale by skipping DCT
+# coefficients, which is several times faster and smaller than decoding a
+# 24 MP photo in full only to shrink it afterwards. The JPEG header is read
+# first to pick the largest reduction that still leaves `min_side` pixels.
+
+# Start-of-frame markers carrying the image size (C4, C8 and CC are not frames)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+REDUCED_COLOR = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def jpeg_size(filename):
+    """Return (height, width) from a JPEG's frame header, or None if it isn't a readable JPEG."""
+    try:
+        with open(filename, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                return None
+            while True:
+                byte = f.read(1)
+                while byte and byte != b"\xff":
+                    byte = f.read(1)
+                while byte == b"\xff":
+                    byte = f.read(1)
+                if not byte:
+                    return None
+                marker = byte[0]
+                if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                    continue  # standalone markers have no length field
+                if marker == 0xD9:
+                    return None
+                (length,) = struct.unpack(">H", f.read(2))
+                if marker in SOF_MARKERS:
+                    f.read(1)  # sample precision
+                    height, width = struct.unpack(">HH", f.read(4))
+                    return height, width
+                f.seek(length - 2, 1)
+    except (OSError, struct.error):
+        return None
+
+
+def read_image(filename, min_side=0, grayscale=False):
+    """cv2.imread, decoding JPEGs at the smallest scale whose shorter side is still >= min_side."""
+    flags = REDUCED_GRAYSCALE if grayscale else REDUCED_COLOR
+    size = jpeg_size(filename) if min_side else None
+    if size:
+        for factor, flag in flags:
+            if min(size) // factor >= min_side:
+                img = cv2.imread(filename, flag)
+                if img is not None:
+                    return img
+                break
+    return cv2.imread(filename, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
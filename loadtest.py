@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import wave
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from urllib.parse import urlparse
+
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("loadtest")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per request otherwise
+
+# ==========================
+# LOAD-TEST HARNESS
+# ==========================
+# Boots the FastAPI app in a child process (`loadtest.py --serve`) with fake
+# Firebase auth and a fake PRAW client, then drives a weighted mix of
+# /predict/* and /feed requests from this process at increasing concurrency
+# and reports throughput, latency percentiles, error rates and the
+# concurrency at which throughput stops scaling. The server runs as it would
+# in production: pipeline sets up the thread budget before anything imports
+# NumPy or OpenCV, and the client does not compete with it for the GIL.
+#
+# The generators below import OpenCV and NumPy lazily for the same reason.
+#
+# Generated media contains no faces, so /predict/video would only exercise
+# decoding and MTCNN before answering with an error. Video is therefore left
+# out of the default mix unless a real sample is given with --video.
+
+
+# --- generated media ---
+
+def generate_image(path, width=1280, height=720):
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (15, 15), 0)
+    cv2.imwrite(path, img)
+    return path
+
+
+def generate_video(path, seconds=3, fps=25, width=640, height=360):
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    base = (rng.random((height, width, 3)) * 255).astype(np.uint8)
+    for i in range(seconds * fps):
+        writer.write(np.roll(base, i * 4, axis=1))
+    writer.release()
+    return path
+
+
+def generate_audio(path, seconds=5, sr=16000):
+    import numpy as np
+
+    t = np.arange(seconds * sr) / sr
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.default_rng(2).standard_normal(len(t))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes((signal * 32767).astype(np.int16).tobytes())
+    return path
+
+
+# --- fake Reddit ---
+
+class FakeSubmission:
+    def __init__(self, index, url):
+        self.title = f"Fake post {index}"
+        self.url = url
+        self.is_video = False
+        self.is_gallery = False
+
+
+class FakeSubreddit:
+    def __init__(self, urls):
+        self.urls = urls
+
+    def _listing(self, limit):
+        return [FakeSubmission(i, self.urls[i % len(self.urls)]) for i in range(limit or 25)]
+
+    def hot(self, limit=None):
+        return self._listing(limit)
+
+    new = top = hot
+
+
+class FakeReddit:
+    def __init__(self, urls):
+        self.urls = urls
+
+    def subreddit(self, name):
+        return FakeSubreddit(self.urls)
+
+
+def fetch_local_media(url):
+    """Pre-scorer media fetcher for the file:// URLs served by FakeReddit.
+
+    The pre-scorer deletes each fetched file after scoring it, so a copy is returned.
+    """
+    source = urllib.request.url2pathname(urlparse(url).path)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(source)[1]) as temp_file:
+        with open(source, "rb") as f:
+            shutil.copyfileobj(f, temp_file)
+        return temp_file.name
+
+
+# --- server ---
+
+def serve(port, feed_urls):
+    """Run the app with the fakes installed (the child process started by start_server)."""
+    # get_current_user is overridden below, so no Firebase key is needed
+    os.environ.setdefault("DFG_ALLOW_NO_FIREBASE", "1")
+    import app as app_module  # first, so pipeline applies the thread budget before NumPy loads
+    import feed_api
+    import uvicorn
+
+    feed_api.reddit = FakeReddit(feed_urls)
+    if feed_api.prescorer is not None:
+        feed_api.prescorer.fetch_media = fetch_local_media
+    app_module.app.dependency_overrides[app_module.get_current_user] = lambda: {
+        "uid": "loadtest", "email": "loadtest@example.com", "admin": False,
+    }
+    uvicorn.run(app_module.app, host="127.0.0.1", port=port, log_level="warning")
+    return 0
+
+
+def start_server(port, feed_urls, timeout=600.0):
+    """Start `loadtest.py --serve` and wait until it answers; loading the models can take a while."""
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port)]
+    for url in feed_urls:
+        command += ["--feed-url", url]
+    process = subprocess.Popen(command)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server failed to start (exit code {process.returncode})")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=5).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    stop_server(process)
+    raise SystemExit(f"Server did not answer within {timeout:.0f}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# --- load generation ---
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+async def run_level(base_url, requests, weights, concurrency, duration):
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    async def user(client):
+        while time.perf_counter() < deadline:
+            name, method, path, files = random.choices(requests, weights=weights)[0]
+            started = time.perf_counter()
+            try:
+                if method == "POST":
+                    upload = {"file": (os.path.basename(files[0]), files[1], files[2])}
+                    response = await client.post(path, files=upload)
+                else:
+                    response = await client.get(path)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples.append((name, time.perf_counter() - started, status))
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    def summarize(rows):
+        latencies = sorted(latency for _, latency, _ in rows)
+        errors = sum(1 for _, _, status in rows if status != 200)
+        return {
+            "requests": len(rows),
+            "throughput": len(rows) / elapsed,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "p50_ms": (percentile(latencies, 0.50) or 0) * 1000,
+            "p90_ms": (percentile(latencies, 0.90) or 0) * 1000,
+            "p99_ms": (percentile(latencies, 0.99) or 0) * 1000,
+        }
+
+    report = {"concurrency": concurrency, "overall": summarize(samples), "endpoints": {}}
+    for name in sorted({name for name, _, _ in samples}):
+        report["endpoints"][name] = summarize([row for row in samples if row[0] == name])
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report["statuses"] = statuses
+    return report
+
+
+def find_saturation(levels, min_gain=0.10, max_error_rate=0.05):
+    """Highest concurrency that still raised throughput by min_gain without exceeding max_error_rate."""
+    best = None
+    for level in levels:
+        overall = level["overall"]
+        if overall["error_rate"] > max_error_rate:
+            break
+        if best is not None and overall["throughput"] < best["overall"]["throughput"] * (1 + min_gain):
+            break
+        best = level
+    return best["concurrency"] if best else None
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Deepfake Guard API with fake auth and Reddit.")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated concurrency levels.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level.")
+    parser.add_argument("--mix", help="Weighted request mix (default: image=4,audio=2,feed=3, plus video=1 with --video).")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--image", help="Image to upload instead of a generated one.")
+    parser.add_argument("--video", help="Video to upload instead of a generated one.")
+    parser.add_argument("--audio", help="Audio to upload instead of a generated one.")
+    parser.add_argument("--json", help="Write the full report to this file.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--feed-url", action="append", default=[], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.port, args.feed_url)
+
+    media_dir = tempfile.mkdtemp(prefix="dfg-loadtest-")
+    image = args.image or generate_image(os.path.join(media_dir, "image.jpg"))
+    video = args.video or generate_video(os.path.join(media_dir, "video.mp4"))
+    audio = args.audio or generate_audio(os.path.join(media_dir, "audio.wav"))
+
+    def upload(path, content_type):
+        with open(path, "rb") as f:
+            return (path, f.read(), content_type)
+
+    available = {
+        "image": ("image", "POST", "/predict/image", upload(image, "image/jpeg")),
+        "video": ("video", "POST", "/predict/video", upload(video, "video/mp4")),
+        "audio": ("audio", "POST", "/predict/audio", upload(audio, "audio/wav")),
+        "feed": ("feed", "GET", "/feed?subreddit=pics&limit=10", None),
+    }
+    mix = parse_mix(args.mix or ("image=4,audio=2,feed=3" + (",video=1" if args.video else "")))
+    requests = [available[name] for name in mix]
+    weights = [mix[name] for name in mix]
+
+    server = start_server(args.port, [f"file://{os.path.abspath(image)}"])
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    levels = []
+    try:
+        for concurrency in [int(c) for c in args.levels.split(",")]:
+            logger.info(f"Running {args.duration:.0f}s at concurrency {concurrency}")
+            level = asyncio.run(run_level(base_url, requests, weights, concurrency, args.duration))
+            levels.append(level)
+            overall = level["overall"]
+            print(
+                f"c={concurrency:<4} {overall['throughput']:8.2f} req/s  p50 {overall['p50_ms']:8.1f} ms  "
+                f"p90 {overall['p90_ms']:8.1f} ms  p99 {overall['p99_ms']:8.1f} ms  errors {overall['error_rate']:6.1%}"
+            )
+            for name, summary in level["endpoints"].items():
+                print(
+                    f"    {name:<6} {summary['throughput']:8.2f} req/s  p50 {summary['p50_ms']:8.1f} ms  "
+                    f"p99 {summary['p99_ms']:8.1f} ms  errors {summary['error_rate']:6.1%}"
+                )
+    finally:
+        stop_server(server)
+
+    saturation = find_saturation(levels)
+    print(f"Saturation point: concurrency {saturation}" if saturation else "Saturation point: not reached")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"mix": mix, "duration": args.duration, "levels": levels, "saturation": saturation}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
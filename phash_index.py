@@ -0,0 +1,370 @@
+import os
+import shutil
+import fcntl
+import logging
+import threading
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+from image_io import read_image
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# PERCEPTUAL HASHES
+# ==========================
+# Every piece of media is reduced to one or more 64-bit hashes that survive
+# re-encoding and resizing: one DCT pHash for an image, one per sampled frame
+# for a video, and one chroma fingerprint per overlapping window for audio.
+
+HASH_BITS = 64
+BLANK_STD = 2.0  # near-uniform frames hash to noise, so they are skipped
+
+
+def _pack_bits(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def image_phash(gray):
+    """64-bit DCT perceptual hash of a grayscale image, or None for a blank image."""
+    if gray.std() < BLANK_STD:
+        return None
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    coeffs = cv2.dct(small)[:8, :8].flatten()
+    median = np.median(coeffs[1:])
+    return _pack_bits(coeffs > median)
+
+
+def hash_image_file(path):
+    gray = read_image(path, min_side=64, grayscale=True)
+    if gray is None:
+        raise ValueError(f"Failed to load image: {path}")
+    h = image_phash(gray)
+    return np.array([] if h is None else [h], dtype=np.uint64)
+
+
+def hash_video_file(path, n_frames=16):
+    v_cap = cv2.VideoCapture(path)
+    if not v_cap.isOpened():
+        raise ValueError(f"Failed to open video: {path}")
+    v_len = int(v_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    sample = set(np.linspace(0, max(v_len - 1, 0), n_frames).astype(int).tolist())
+    hashes = []
+    for j in range(v_len):
+        if not v_cap.grab():
+            break
+        if j in sample:
+            success, frame = v_cap.retrieve()
+            if not success:
+                continue
+            h = image_phash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            if h is not None:
+                hashes.append(h)
+    v_cap.release()
+    return np.array(hashes, dtype=np.uint64)
+
+
+def audio_fingerprint(y, sr, window_seconds=2.0, hop_seconds=1.0):
+    """Chroma-based fingerprint: one 64-bit hash per overlapping window.
+
+    Each window's 12-bin chromagram is averaged into 6 time slices and the
+    bits record whether each pitch class gets louder from one slice to the
+    next (60 bits), plus whether each slice's energy rises (4 bits).
+    """
+    import librosa
+
+    hop_length = 512
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length)
+    energy = librosa.feature.rms(y=y, hop_length=hop_length)[0]
+    frames_per_window = max(int(window_seconds * sr / hop_length), 6)
+    frames_per_hop = max(int(hop_seconds * sr / hop_length), 1)
+    hashes = []
+    for start in range(0, max(chroma.shape[1] - frames_per_window, 0) + 1, frames_per_hop):
+        segment = chroma[:, start:start + frames_per_window]
+        if segment.shape[1] < 6 or energy[start:start + frames_per_window].max() < 1e-4:
+            continue
+        slices = np.stack([s.mean(axis=1) for s in np.array_split(segment, 6, axis=1)], axis=1)
+        levels = np.array([s.mean() for s in np.array_split(energy[start:start + frames_per_window], 5)])
+        bits = np.concatenate([(slices[:, 1:] > slices[:, :-1]).flatten(), levels[1:] > levels[:-1]])
+        hashes.append(_pack_bits(bits))
+    return np.array(hashes, dtype=np.uint64)
+
+
+def hash_audio_file(path, hop_seconds=0.1):
+    import librosa
+
+    y, sr = librosa.load(path, sr=11025, mono=True)
+    return audio_fingerprint(y, sr, hop_seconds=hop_seconds)
+
+
+HASHERS = {"image": hash_image_file, "video": hash_video_file, "audio": hash_audio_file}
+
+# Audio windows are stored at a fine hop so a trimmed or shifted copy still
+# lines up with some stored window; querying every 10th (~1 s apart) is enough.
+LOOKUP_STRIDE = {"image": 1, "video": 1, "audio": 10}
+
+# ==========================
+# MULTI-INDEX HASH TABLE
+# ==========================
+# Hashes are split into three ~21-bit chunks. If two hashes are within Hamming
+# distance r, at least one chunk differs in at most r // 3 bits, so a lookup
+# probes each chunk's sorted table for every value within that radius and only
+# checks full distances on the few candidates found. With ~2^21 buckets per
+# chunk, a table of a few million hashes holds about one entry per bucket.
+#
+# On disk the index is a directory of .npy arrays opened with mmap_mode="r":
+#   hashes.npy  uint64[N]   all hashes
+#   owners.npy  uint32[N]   item id of each hash
+#   chunk{i}.npy / order{i}.npy   chunk i's values sorted, and the hash ids in that order
+#   items.npy   one record (modality, result, confidence) per indexed file
+# A FAKE verdict is reused when at least min_match of the query hashes are
+# within max_distance of the item. Any other verdict is reused only when every
+# query hash is within reuse_distance: a face-swap made from an indexed real
+# video changes little of each frame, so a loose match must never return REAL.
+# New entries are kept in memory and merged into the files by save(), which
+# a background thread runs once autosave_every of them have accumulated.
+
+CHUNK_WIDTHS = (22, 21, 21)
+CHUNK_SHIFTS = (0, 22, 43)
+ITEM_DTYPE = np.dtype([("modality", "U5"), ("result", "U16"), ("confidence", np.float32)])
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount64(x):
+    x = np.ascontiguousarray(x, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _probe_masks(width, radius):
+    masks = [0]
+    for k in range(1, radius + 1):
+        masks.extend(sum(1 << b for b in bits) for bits in combinations(range(width), k))
+    return np.array(masks, dtype=np.uint32)
+
+
+def _chunk(hashes, i):
+    mask = np.uint64((1 << CHUNK_WIDTHS[i]) - 1)
+    return ((hashes >> np.uint64(CHUNK_SHIFTS[i])) & mask).astype(np.uint32)
+
+
+class PerceptualIndex:
+    def __init__(self, path, max_distance=8, min_match=0.5, reuse_distance=2, autosave_every=256,
+                 refresh_interval=30.0):
+        self.path = path
+        self.max_distance = max_distance
+        self.min_match = min_match
+        self.reuse_distance = reuse_distance
+        self.autosave_every = autosave_every
+        self.refresh_interval = refresh_interval
+        self._masks = [_probe_masks(width, max_distance // len(CHUNK_WIDTHS)) for width in CHUNK_WIDTHS]
+        self._lock = threading.RLock()  # guards the in-memory arrays and pending entries
+        self._save_lock = threading.Lock()  # one merge or reload at a time in this process
+        self._pending_hashes = []
+        self._pending_owners = []
+        self._pending_items = []
+        self._install(*self._read())
+        # Merges and reloads run on this thread, so lookups never wait for disk I/O.
+        self._wake = threading.Event()
+        threading.Thread(target=self._background, name="phash-index", daemon=True).start()
+
+    # --- persistence ---
+    # Writers hold <path>.write.lock for a whole merge. The new version is
+    # swapped in under an exclusive <path>.lock, and readers open the files
+    # under a shared <path>.lock, so they always see one complete version.
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read(self):
+        """Open the on-disk index as (mtime, hashes, owners, items, chunks, orders)."""
+        try:
+            lock_file = open(self.path + ".lock", "r")
+        except FileNotFoundError:
+            lock_file = None  # nothing has been saved yet
+        try:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+            mtime = self._mtime()
+            if mtime is None:
+                return (None, np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=ITEM_DTYPE),
+                        [np.zeros(0, dtype=np.uint32)] * len(CHUNK_WIDTHS), [np.zeros(0, dtype=np.uint32)] * len(CHUNK_WIDTHS))
+            load = lambda name: np.load(self._file(name), mmap_mode="r")
+            return (mtime, load("hashes.npy"), load("owners.npy"), load("items.npy"),
+                    [load(f"chunk{i}.npy") for i in range(len(CHUNK_WIDTHS))],
+                    [load(f"order{i}.npy") for i in range(len(CHUNK_WIDTHS))])
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    def _install(self, mtime, hashes, owners, items, chunks, orders):
+        with self._lock:
+            self._loaded_mtime = mtime
+            self._hashes, self._owners, self._items = hashes, owners, items
+            self._chunks, self._orders = chunks, orders
+        if mtime is not None:
+            logger.info(f"Loaded perceptual index with {len(items)} items / {len(hashes)} hashes from {self.path}")
+
+    def _mtime(self):
+        try:
+            return os.stat(self._file("items.npy")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        # Pick up saves made by other worker processes.
+        with self._save_lock:
+            if self._mtime() != self._loaded_mtime:
+                self._install(*self._read())
+
+    def _background(self):
+        while True:
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            try:
+                if len(self._pending_items) >= self.autosave_every:
+                    self.save()
+                else:
+                    self._refresh()
+            except Exception as e:
+                logger.error(f"Perceptual index update failed: {str(e)}")
+
+    def save(self):
+        """Merge pending entries into the on-disk index (safe with several writer processes).
+
+        Lookups keep using the current arrays and pending entries while the
+        merged index is written; both are swapped in one step at the end.
+        """
+        with self._save_lock:
+            with self._lock:
+                n_items, n_hashes = len(self._pending_items), len(self._pending_hashes)
+                if not n_items:
+                    return
+                new_hashes = np.array(self._pending_hashes[:n_hashes], dtype=np.uint64)
+                new_owners = np.array(self._pending_owners[:n_hashes], dtype=np.uint32)
+                new_items = np.array(self._pending_items[:n_items], dtype=ITEM_DTYPE)
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path + ".write.lock", "a") as write_lock:
+                fcntl.flock(write_lock, fcntl.LOCK_EX)
+                _, hashes, owners, items, _, _ = self._read()
+                owners = np.concatenate([owners, new_owners + np.uint32(len(items))])
+                hashes = np.concatenate([hashes, new_hashes])
+                items = np.concatenate([items, new_items])
+
+                tmp = self.path + f".tmp{os.getpid()}"
+                os.makedirs(tmp, exist_ok=True)
+                np.save(os.path.join(tmp, "hashes.npy"), hashes)
+                np.save(os.path.join(tmp, "owners.npy"), owners)
+                for i in range(len(CHUNK_WIDTHS)):
+                    chunk = _chunk(hashes, i)
+                    order = np.argsort(chunk, kind="stable").astype(np.uint32)
+                    np.save(os.path.join(tmp, f"chunk{i}.npy"), chunk[order])
+                    np.save(os.path.join(tmp, f"order{i}.npy"), order)
+                # items.npy is written last: its mtime is what readers watch.
+                np.save(os.path.join(tmp, "items.npy"), items)
+
+                old = self.path + f".old{os.getpid()}"
+                with open(self.path + ".lock", "a") as swap_lock:
+                    fcntl.flock(swap_lock, fcntl.LOCK_EX)
+                    if os.path.exists(self.path):
+                        os.rename(self.path, old)
+                    os.rename(tmp, self.path)
+                shutil.rmtree(old, ignore_errors=True)
+                loaded = self._read()
+
+            with self._lock:
+                self._install(*loaded)
+                # Entries added during the merge stay pending, renumbered from 0.
+                del self._pending_items[:n_items]
+                del self._pending_hashes[:n_hashes]
+                self._pending_owners = [owner - n_items for owner in self._pending_owners[n_hashes:]]
+
+    # --- queries ---
+
+    def _candidates(self, h):
+        """Ids of stored hashes within max_distance of h, and their distances."""
+        empty = np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8)
+        if len(self._hashes) == 0:
+            return empty
+        h = np.uint64(h)
+        found = []
+        for i in range(len(CHUNK_WIDTHS)):
+            table = self._chunks[i]
+            keys = _chunk(h, i) ^ self._masks[i]
+            lo = np.searchsorted(table, keys, side="left")
+            hi = np.searchsorted(table, keys, side="right")
+            hit = hi > lo
+            lo, lengths = lo[hit], (hi - lo)[hit]
+            if len(lo):
+                # Gather all [lo, hi) runs of the order table in one fancy-index call.
+                starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+                found.append(self._orders[i][np.arange(lengths.sum()) + starts])
+        if not found:
+            return empty
+        ids = np.concatenate(found)
+        distances = _popcount64(self._hashes[ids] ^ h)
+        close = distances <= self.max_distance
+        return ids[close], distances[close]
+
+    def lookup(self, modality, hashes):
+        """Return the stored verdict of a near-duplicate of this media, or None."""
+        if len(hashes) == 0:
+            return None
+        with self._lock:
+            votes, exact_votes = {}, {}
+            pending_hashes = np.array(self._pending_hashes, dtype=np.uint64)
+            pending_owners = np.array(self._pending_owners, dtype=np.int64)
+            for h in hashes:
+                ids, distances = self._candidates(h)
+                owners, distances = self._owners[ids].tolist(), distances.tolist()
+                if len(pending_hashes):
+                    pending_distances = _popcount64(pending_hashes ^ np.uint64(h))
+                    close = pending_distances <= self.max_distance
+                    owners += (-1 - pending_owners[close]).tolist()
+                    distances += pending_distances[close].tolist()
+                closest = {}
+                for owner, distance in zip(owners, distances):
+                    closest[owner] = min(distance, closest.get(owner, distance))
+                for owner, distance in closest.items():
+                    votes[owner] = votes.get(owner, 0) + 1
+                    if distance <= self.reuse_distance:
+                        exact_votes[owner] = exact_votes.get(owner, 0) + 1
+
+            best, best_votes = None, 0
+            for owner, count in votes.items():
+                item = self._pending_items[-1 - owner] if owner < 0 else self._items[owner]
+                if item[0] != modality or count <= best_votes:
+                    continue
+                if str(item[1]).upper().startswith("FAKE"):
+                    reusable = count >= self.min_match * len(hashes)
+                else:
+                    reusable = exact_votes.get(owner, 0) == len(hashes)
+                if reusable:
+                    best, best_votes = item, count
+            if best is None:
+                return None
+            confidence = float(best[2])
+            return {"result": str(best[1]), "confidence": None if np.isnan(confidence) else confidence}
+
+    def add(self, modality, hashes, verdict):
+        if len(hashes) == 0:
+            return
+        confidence = verdict.get("confidence")
+        with self._lock:
+            owner = len(self._pending_items)
+            self._pending_items.append((modality, verdict["result"], np.nan if confidence is None else confidence))
+            self._pending_hashes.extend(int(h) for h in hashes)
+            self._pending_owners.extend([owner] * len(hashes))
+            if len(self._pending_items) >= self.autosave_every:
+                self._wake.set()
+
+    def __len__(self):
+        return len(self._items) + len(self._pending_items)
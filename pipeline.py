@@ -1,18 +1,34 @@
 import os
+import thread_budget
+thread_budget.configure_env()  # must precede the NumPy/OpenCV/PyTorch imports below
 import cv2
+from collections import deque
 import torch
 import librosa
 import numpy as np
 import tensorflow as tf
 import tensorflow_addons as tfa
 from facenet_pytorch import MTCNN
-from rawnet import RawNet
+from rawnet import RawNet, StreamingRawNet
+from image_io import read_image
+from phash_index import PerceptualIndex, HASHERS, LOOKUP_STRIDE
+import atexit
 import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# Size every framework's thread pool to this worker's CPU budget
+thread_budget.configure_frameworks(tf=tf, torch=torch, cv2=cv2)
+
 # Set random seed
 tf.random.set_seed(42)
 
@@ -26,14 +42,101 @@ except Exception as e:
     logger.error(f"Failed to load EfficientNet model: {str(e)}")
     raise RuntimeError(f"Failed to load EfficientNet model: {str(e)}")
 
+# Cascade screener (DFG_CASCADE=1): a cheap model scores every crop first and
+# only crops whose fake score lands inside (DFG_CASCADE_LOW, DFG_CASCADE_HIGH)
+# are escalated to the full EfficientNet. A distilled model in models/screener
+# is used if present; otherwise EfficientNet itself is rebuilt for
+# DFG_CASCADE_SIZE x DFG_CASCADE_SIZE inputs, sharing the trained weights.
+CASCADE_ENABLED = os.getenv("DFG_CASCADE", "0") == "1"
+CASCADE_SIZE = int(os.getenv("DFG_CASCADE_SIZE", "112"))
+CASCADE_LOW = float(os.getenv("DFG_CASCADE_LOW", "0.1"))
+CASCADE_HIGH = float(os.getenv("DFG_CASCADE_HIGH", "0.9"))
+
+
+def _with_input_size(config, size):
+    # Rewrite every 4-D batch_input_shape in a (possibly nested) Keras config.
+    if isinstance(config, dict):
+        shape = config.get("batch_input_shape")
+        if shape is not None and len(shape) == 4:
+            config["batch_input_shape"] = [shape[0], size, size, shape[3]]
+        for value in config.values():
+            _with_input_size(value, size)
+    elif isinstance(config, list):
+        for value in config:
+            _with_input_size(value, size)
+    return config
+
+
+def load_screener():
+    """Return (screener, (height, width) of the crops to feed it), or (None, None) if it cannot be loaded."""
+    screener_path = os.path.join(os.path.dirname(__file__), "models", "screener")
+    try:
+        if os.path.exists(screener_path):
+            logger.info(f"Loading cascade screener from {screener_path}")
+            screener = tf.keras.models.load_model(screener_path, custom_objects=custom_objects)
+            height, width = screener.input_shape[1:3]
+            if isinstance(height, int) and isinstance(width, int):
+                return screener, (height, width)
+            # Saved with a dynamic input shape such as (None, None, 3), so any size works
+            logger.info(f"Screener input size is not fixed, feeding it {CASCADE_SIZE}x{CASCADE_SIZE} crops")
+            return screener, (CASCADE_SIZE, CASCADE_SIZE)
+        logger.info(f"Building {CASCADE_SIZE}x{CASCADE_SIZE} cascade screener from EfficientNet weights")
+        config = _with_input_size(model.get_config(), CASCADE_SIZE)
+        screener = model.__class__.from_config(config, custom_objects=custom_objects)
+        screener.set_weights(model.get_weights())
+        return screener, (CASCADE_SIZE, CASCADE_SIZE)
+    except Exception as e:
+        logger.warning(f"Cascade disabled, failed to build screener: {str(e)}")
+        return None, None
+
+
+screener, screener_size = load_screener() if CASCADE_ENABLED else (None, None)
+cascade_counts = {"screened": 0, "escalated": 0}
+cascade_lock = threading.Lock()
+
+
+def cascade_stats():
+    with cascade_lock:
+        screened, escalated = cascade_counts["screened"], cascade_counts["escalated"]
+    return {
+        "enabled": screener is not None,
+        "band": [CASCADE_LOW, CASCADE_HIGH],
+        "screened": screened,
+        "escalated": escalated,
+        "escalation_rate": escalated / screened if screened else None,
+    }
+
+
 # Detection Pipeline class
 class DetectionPipeline:
-    def __init__(self, n_frames=10, batch_size=60, resize=None, input_modality='video'):
+    def __init__(self, n_frames=10, batch_size=60, resize=None, input_modality='video', face_crop=False,
+                 decode_min_side=None):
         self.n_frames = n_frames
         self.batch_size = batch_size
         self.resize = resize
         self.input_modality = input_modality
-        self.mtcnn = MTCNN(image_size=224, margin=0, device='cpu') if input_modality == 'video' else None
+        # Images are cropped to their faces (like video frames) only when face_crop is set
+        self.face_crop = face_crop
+        use_mtcnn = input_modality == 'video' or (input_modality == 'image' and face_crop)
+        self.mtcnn = MTCNN(image_size=224, margin=0, device='cpu') if use_mtcnn else None
+        # Smallest image side to decode JPEGs at: enough for the 224x224 model input,
+        # or enough for MTCNN to still find faces when cropping.
+        self.decode_min_side = decode_min_side or (1080 if face_crop else 224)
+
+    def detect_faces(self, frame):
+        """Return 224x224 face crops found in one RGB frame."""
+        if self.resize:
+            frame = cv2.resize(frame, (int(frame.shape[1] * self.resize), int(frame.shape[0] * self.resize)))
+        faces = []
+        if self.mtcnn:
+            boxes, _ = self.mtcnn.detect(frame)
+            if boxes is not None:
+                for box in boxes:
+                    x1, y1, x2, y2 = [int(b) for b in box]
+                    face = frame[y1:y2, x1:x2]
+                    if face.size > 0:
+                        faces.append(cv2.resize(face, (224, 224)))
+        return faces
 
     def __call__(self, filename):
         if self.input_modality == 'video':
@@ -53,17 +156,7 @@ class DetectionPipeline:
                     if not success:
                         continue
                     frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    if self.resize:
-                        frame = cv2.resize(frame, (int(frame.shape[1] * self.resize), int(frame.shape[0] * self.resize)))
-                    if self.mtcnn:
-                        boxes, _ = self.mtcnn.detect(frame)
-                        if boxes is not None:
-                            for box in boxes:
-                                x1, y1, x2, y2 = [int(b) for b in box]
-                                face = frame[y1:y2, x1:x2]
-                                if face.size > 0:
-                                    face = cv2.resize(face, (224, 224))
-                                    faces.append(face)
+                    faces.extend(self.detect_faces(frame))
             v_cap.release()
             if not faces:
                 logger.error("No faces detected in video")
@@ -73,11 +166,17 @@ class DetectionPipeline:
 
         elif self.input_modality == 'image':
             logger.info(f"Processing image: {filename}")
-            img = cv2.imread(filename)
+            img = read_image(filename, min_side=self.decode_min_side)
             if img is None:
                 logger.error(f"Failed to load image: {filename}")
                 raise ValueError(f"Failed to load image: {filename}")
             img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            if self.face_crop:
+                faces = self.detect_faces(img)
+                if faces:
+                    logger.info(f"Extracted {len(faces)} faces from image")
+                    return faces
+                logger.info("No faces detected in image, scoring the whole image")
             img = cv2.resize(img, (224, 224))
             return img
 
@@ -104,49 +203,227 @@ class DetectionPipeline:
 
 # Initialize pipelines
 video_pipeline = DetectionPipeline(n_frames=5, batch_size=1, input_modality='video')
-image_pipeline = DetectionPipeline(batch_size=1, input_modality='image')
+image_pipeline = DetectionPipeline(batch_size=1, input_modality='image',
+                                   face_crop=os.getenv("DFG_IMAGE_FACE_CROP", "0") == "1")
 audio_pipeline = DetectionPipeline(input_modality='audio')
 
 
+# Near-duplicate verdict cache: set DFG_PHASH_INDEX to a directory to enable it.
+# Re-encoded/resized copies of media scored before skip the models entirely.
+known_media_path = os.getenv("DFG_PHASH_INDEX")
+known_media_index = PerceptualIndex(known_media_path) if known_media_path else None
+if known_media_index is not None:
+    atexit.register(known_media_index.save)
+
+
+# Set per thread by known_media_bypassed(), so a profiled request always runs the models.
+_known_media_bypass = threading.local()
+
+
+@contextmanager
+def known_media_bypassed():
+    _known_media_bypass.active = True
+    try:
+        yield
+    finally:
+        _known_media_bypass.active = False
+
+
+def _lookup_known(modality, path):
+    """Return (hashes, cached verdict or None); hashes is None when the cache is disabled or bypassed."""
+    if known_media_index is None or getattr(_known_media_bypass, "active", False):
+        return None, None
+    try:
+        hashes = HASHERS[modality](path)
+    except Exception as e:
+        logger.warning(f"Perceptual hashing failed for {path}: {str(e)}")
+        return None, None
+    verdict = known_media_index.lookup(modality, hashes[::LOOKUP_STRIDE[modality]])
+    if verdict is not None:
+        logger.info(f"Known {modality} near-duplicate: {verdict['result']}")
+    return hashes, verdict
+
+
+def _remember(modality, hashes, verdict):
+    if hashes is not None:
+        known_media_index.add(modality, hashes, verdict)
+
+
+# Run EfficientNet on a list of 224x224 RGB crops in batches
+def _predict_faces(faces, batch_size=32):
+    if screener is None:
+        batch = np.asarray(faces, dtype=np.float32) / 255.0
+        return model.predict(batch, batch_size=batch_size, verbose=0)
+
+    height, width = screener_size
+    small = np.asarray([cv2.resize(face, (width, height), interpolation=cv2.INTER_AREA) for face in faces])
+    preds = screener.predict(small.astype(np.float32) / 255.0, batch_size=batch_size, verbose=0)
+    uncertain = (preds[:, 1] > CASCADE_LOW) & (preds[:, 1] < CASCADE_HIGH)
+    if uncertain.any():
+        batch = np.asarray([face for face, keep in zip(faces, uncertain) if keep], dtype=np.float32) / 255.0
+        preds[uncertain] = model.predict(batch, batch_size=batch_size, verbose=0)
+    with cascade_lock:
+        cascade_counts["screened"] += len(faces)
+        cascade_counts["escalated"] += int(uncertain.sum())
+    return preds
+
+
+# Average per-face [real, fake] scores into a single video verdict
+def _video_verdict(preds):
+    real_mean = float(np.mean([p[0] for p in preds]))
+    fake_mean = float(np.mean([p[1] for p in preds]))
+    result = "REAL" if real_mean >= 0.5 else "FAKE"
+    confidence = round(real_mean * 100 if real_mean >= 0.5 else fake_mean * 100, 3)
+    return {"result": result, "confidence": confidence}
+
+
 # Video prediction
 def deepfakes_video_predict(input_video):
     try:
+        hashes, cached = _lookup_known("video", input_video)
+        if cached is not None:
+            return cached
         faces = video_pipeline(input_video)
-        real_res, fake_res = [], []
-
-        for face in faces:
-            face_norm = np.array(face, dtype=np.float32) / 255.0
-            pred = model.predict(np.expand_dims(face_norm, axis=0), verbose=0)[0]
-            real_res.append(float(pred[0]))
-            fake_res.append(float(pred[1]))
-
-        real_mean = float(np.mean(real_res))
-        fake_mean = float(np.mean(fake_res))
-        result = "REAL" if real_mean >= 0.5 else "FAKE"
-        confidence = round(real_mean * 100 if real_mean >= 0.5 else fake_mean * 100, 3)
-        logger.info(f"Video prediction: {result} ({confidence}%)")
-        return {"result": result, "confidence": confidence}
+        verdict = _video_verdict(_predict_faces(faces))
+        logger.info(f"Video prediction: {verdict['result']} ({verdict['confidence']}%)")
+        _remember("video", hashes, verdict)
+        return verdict
     except Exception as e:
         logger.error(f"Video prediction failed: {str(e)}")
         raise RuntimeError(f"Video prediction failed: {str(e)}")
 
 
+# Incremental video scoring for live streams
+class StreamingVideoScorer:
+    """Score a live stream of encoded frames, emitting a rolling verdict after every window.
+
+    Every `sample_every`-th frame is decoded and searched for faces. Once
+    `window` frames have been sampled their faces are scored in one batch and
+    the verdict is recomputed over the last `history` windows.
+    """
+
+    def __init__(self, sample_every=5, window=5, history=6):
+        self.sample_every = sample_every
+        self.window = window
+        self.frames_seen = 0
+        self.frames_sampled = 0
+        self.windows_scored = 0
+        self.pending_faces = []
+        self.history = deque(maxlen=history)
+
+    def push(self, data):
+        """Feed one encoded (JPEG/PNG) frame; returns a verdict dict when a window completes, else None."""
+        self.frames_seen += 1
+        if (self.frames_seen - 1) % self.sample_every:
+            return None
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError(f"Failed to decode frame {self.frames_seen}")
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        self.pending_faces.extend(video_pipeline.detect_faces(frame))
+        self.frames_sampled += 1
+        if self.frames_sampled % self.window:
+            return None
+        return self._close_window()
+
+    def flush(self):
+        """Score a partially filled last window, if any."""
+        if self.frames_sampled % self.window == 0:
+            return None
+        return self._close_window()
+
+    def _close_window(self):
+        faces, self.pending_faces = self.pending_faces, []
+        self.windows_scored += 1
+        if faces:
+            self.history.append(_predict_faces(faces))
+        verdict = {"window": self.windows_scored, "frames": self.frames_seen, "faces": len(faces)}
+        preds = [p for window_preds in self.history for p in window_preds]
+        if preds:
+            verdict.update(_video_verdict(preds))
+        else:
+            verdict.update({"result": None, "confidence": None})
+        return verdict
+
+
 # Image prediction
+def _image_verdict(pred):
+    real, fake = float(pred[0]), float(pred[1])
+    result = "REAL" if real > 0.5 else "FAKE"
+    confidence = round((100 - real * 100) if real > 0.5 else (fake * 100), 3)
+    return {"result": result, "confidence": confidence}
+
+
+# Face-cropped images are scored like a video: the per-face scores are
+# averaged into one verdict, and each face's own verdict is listed too. Every
+# confidence here is the probability of the reported label.
+def _face_crop_verdict(preds):
+    verdict = _video_verdict(preds)
+    verdict["faces"] = [_video_verdict([pred]) for pred in preds]
+    return verdict
+
+
+# In face-crop mode every image response carries "faces": [] when no face was
+# found and the whole image was scored, or None on a near-duplicate cache hit
+# (the index stores only the overall verdict).
+def _with_faces(verdict, faces):
+    return dict(verdict, faces=faces) if image_pipeline.face_crop else verdict
+
+
+# A whole image scored in face-crop mode (no face found) follows the same
+# convention as the face verdicts, so its confidence is also that of its label.
+def _whole_image_verdict(pred):
+    if image_pipeline.face_crop:
+        return _with_faces(_video_verdict([pred]), [])
+    return _image_verdict(pred)
+
+
 def deepfakes_image_predict(input_image):
     try:
-        face = image_pipeline(input_image)
-        face_norm = np.array(face, dtype=np.float32) / 255.0
-        pred = model.predict(np.expand_dims(face_norm, axis=0), verbose=0)[0]
-        real, fake = float(pred[0]), float(pred[1])
-        result = "REAL" if real > 0.5 else "FAKE"
-        confidence = round((100 - real * 100) if real > 0.5 else (fake * 100), 3)
-        logger.info(f"Image prediction: {result} ({confidence}%)")
-        return {"result": result, "confidence": confidence}
+        hashes, cached = _lookup_known("image", input_image)
+        if cached is not None:
+            return _with_faces(cached, None)
+        crops = image_pipeline(input_image)
+        if isinstance(crops, list):
+            verdict = _face_crop_verdict(_predict_faces(crops))
+        else:
+            verdict = _whole_image_verdict(_predict_faces([crops])[0])
+        logger.info(f"Image prediction: {verdict['result']} ({verdict['confidence']}%)")
+        _remember("image", hashes, verdict)
+        return verdict
     except Exception as e:
         logger.error(f"Image prediction failed: {str(e)}")
         raise RuntimeError(f"Image prediction failed: {str(e)}")
 
 
+# Batched image prediction: one model call for several files.
+# Files that fail to load get an {"error": ...} entry instead of failing the batch.
+def deepfakes_image_predict_batch(input_images, batch_size=32):
+    results = [None] * len(input_images)
+    faces, pending = [], []
+    for i, path in enumerate(input_images):
+        try:
+            path_hashes, results[i] = _lookup_known("image", path)
+            if results[i] is not None:
+                results[i] = _with_faces(results[i], None)
+            else:
+                crops = image_pipeline(path)
+                cropped = isinstance(crops, list)
+                faces.extend(crops if cropped else [crops])
+                pending.append((i, len(crops) if cropped else 1, cropped, path_hashes))
+        except Exception as e:
+            results[i] = {"error": str(e)}
+    if faces:
+        preds = _predict_faces(faces, batch_size=batch_size)
+        offset = 0
+        for i, count, cropped, path_hashes in pending:
+            file_preds = preds[offset:offset + count]
+            offset += count
+            results[i] = _face_crop_verdict(file_preds) if cropped else _whole_image_verdict(file_preds[0])
+            _remember("image", path_hashes, results[i])
+    return results
+
+
 # Load audio model
 def load_audio_model():
     args = {
@@ -164,8 +441,16 @@ def load_audio_model():
     ckpt_path = os.path.join(os.path.dirname(__file__), "models", "rawnet", "RawNet2.pth")
     try:
         logger.info(f"Loading RawNet model from {ckpt_path}")
-        ckpt = torch.load(ckpt_path, map_location=torch.device('cpu'))
-        model.load_state_dict(ckpt, strict=True)
+        # Map the checkpoint instead of copying it: the weights then live in the
+        # file's page-cache pages, shared by every serve.py worker.
+        try:
+            ckpt = torch.load(ckpt_path, map_location=torch.device('cpu'), mmap=True)
+            model.load_state_dict(ckpt, strict=True, assign=True)
+        except (TypeError, RuntimeError) as e:
+            # Older PyTorch, or a legacy (non-zip) checkpoint that cannot be mapped
+            logger.warning(f"Loading RawNet weights without mmap: {str(e)}")
+            ckpt = torch.load(ckpt_path, map_location=torch.device('cpu'))
+            model.load_state_dict(ckpt, strict=True)
         model.eval()
     except Exception as e:
         logger.error(f"Failed to load RawNet model: {str(e)}")
@@ -180,16 +465,142 @@ audio_label_map = {0: "Real audio", 1: "Fake audio"}
 # Audio prediction
 def deepfakes_audio_predict(input_audio):
     try:
+        hashes, cached = _lookup_known("audio", input_audio)
+        if cached is not None:
+            return cached
         x_pt = audio_pipeline(input_audio)
         if x_pt.shape[1] != 64600:
             logger.error(f"Audio input length {x_pt.shape[1]} does not match expected 64600")
             raise ValueError(f"Audio input length {x_pt.shape[1]} does not match expected 64600")
         with torch.no_grad():
             logits = audio_model(x_pt)
-        pred = int(torch.argmax(logits, dim=1).item())
+        probs = torch.exp(logits)[0]
+        pred = int(torch.argmax(probs).item())
         result = audio_label_map[pred]
-        logger.info(f"Audio prediction: {result}")
-        return {"result": result}
+        confidence = round(float(probs[pred]) * 100, 3)
+        logger.info(f"Audio prediction: {result} ({confidence}%)")
+        verdict = {"result": result, "confidence": confidence}
+        _remember("audio", hashes, verdict)
+        return verdict
     except Exception as e:
         logger.error(f"Audio prediction failed: {str(e)}")
         raise RuntimeError(f"Audio prediction failed: {str(e)}")
+
+
+# Batched audio prediction: clips are fixed-length, so they stack into one RawNet call.
+# Files that fail to load get an {"error": ...} entry instead of failing the batch.
+def deepfakes_audio_predict_batch(input_audios, batch_size=16):
+    results = [None] * len(input_audios)
+    tensors, indices, hashes = [], [], []
+    for i, path in enumerate(input_audios):
+        try:
+            path_hashes, results[i] = _lookup_known("audio", path)
+            if results[i] is None:
+                tensors.append(audio_pipeline(path))
+                indices.append(i)
+                hashes.append(path_hashes)
+        except Exception as e:
+            results[i] = {"error": str(e)}
+    for start in range(0, len(tensors), batch_size):
+        x_pt = torch.cat(tensors[start:start + batch_size], dim=0)
+        with torch.no_grad():
+            probs = torch.exp(audio_model(x_pt))
+        batch = zip(indices[start:start + batch_size], probs, hashes[start:start + batch_size])
+        for i, prob, path_hashes in batch:
+            pred = int(torch.argmax(prob).item())
+            results[i] = {"result": audio_label_map[pred], "confidence": round(float(prob[pred]) * 100, 3)}
+            _remember("audio", path_hashes, results[i])
+    return results
+
+
+# Demux a video's audio track to a temporary 16 kHz mono WAV. "-vn" drops the
+# video stream, so only the audio is decoded. Returns None if there is no audio.
+def extract_audio_track(input_video):
+    fd, wav_path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    # RawNet only reads the first 64600 samples (4.0375 s at 16 kHz), so decode no more than that.
+    command = [FFMPEG_BIN, "-nostdin", "-loglevel", "error", "-y", "-i", input_video,
+               "-vn", "-sn", "-dn", "-map", "0:a:0", "-t", "4.0375", "-ac", "1", "-ar", "16000", "-f", "wav", wav_path]
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=120)
+    except (subprocess.TimeoutExpired, OSError):
+        # ffmpeg hung or is missing
+        os.unlink(wav_path)
+        raise
+    if completed.returncode != 0 or os.path.getsize(wav_path) == 0:
+        os.unlink(wav_path)
+        logger.info(f"No audio track extracted from {input_video}: {completed.stderr.decode(errors='replace').strip()}")
+        return None
+    return wav_path
+
+
+# None when the verdict carries no confidence (e.g. cached before confidences were stored)
+def _fake_probability(verdict):
+    if verdict.get("confidence") is None:
+        return None
+    confidence = verdict["confidence"] / 100
+    return confidence if verdict["result"].upper().startswith("FAKE") else 1 - confidence
+
+
+def _audio_from_video_predict(input_video):
+    wav_path = extract_audio_track(input_video)
+    if wav_path is None:
+        return None
+    try:
+        return deepfakes_audio_predict(wav_path)
+    finally:
+        os.unlink(wav_path)
+
+
+# Joint audio+visual video prediction. The face branch and the audio branch
+# run in parallel, so wall time tracks the slower branch rather than the sum.
+# The fused verdict is FAKE if either track looks manipulated.
+av_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="av-predict")
+
+
+def deepfakes_av_predict(input_video):
+    video_future = av_executor.submit(deepfakes_video_predict, input_video)
+    audio_future = av_executor.submit(_audio_from_video_predict, input_video)
+    video_verdict = video_future.result()
+    try:
+        audio_verdict = audio_future.result()
+    except Exception as e:
+        logger.warning(f"Audio branch failed for {input_video}: {str(e)}")
+        audio_verdict = None
+
+    probabilities = [_fake_probability(v) for v in (video_verdict, audio_verdict) if v is not None]
+    probabilities = [p for p in probabilities if p is not None]
+    if not probabilities:
+        # Neither branch has a confidence to fuse; fall back to the face verdict.
+        result, confidence = video_verdict["result"], None
+    else:
+        fake_probability = max(probabilities)
+        result = "FAKE" if fake_probability > 0.5 else "REAL"
+        confidence = round((fake_probability if result == "FAKE" else 1 - fake_probability) * 100, 3)
+    logger.info(f"Audio+visual prediction: {result} ({confidence}%)")
+    return {"result": result, "confidence": confidence, "video": video_verdict, "audio": audio_verdict}
+
+
+# Streaming audio prediction: scores a live 16 kHz signal chunk by chunk,
+# carrying RawNet's convolution context and GRU state between chunks.
+# The last verdict, after the held-back frames are flushed, has "final": True.
+def deepfakes_audio_stream_predict(chunks):
+    def verdict(logits, final):
+        probs = torch.exp(logits)[0]
+        pred = int(torch.argmax(probs).item())
+        return {"result": audio_label_map[pred], "confidence": round(float(probs[pred]) * 100, 3),
+                "samples": samples, "final": final}
+
+    stream = StreamingRawNet(audio_model)
+    samples = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float32)
+        samples += len(chunk)
+        with torch.no_grad():
+            logits = stream(torch.from_numpy(chunk).unsqueeze(0))
+        if logits is not None:
+            yield verdict(logits, False)
+    with torch.no_grad():
+        logits = stream.flush()
+    if logits is not None:
+        yield verdict(logits, True)
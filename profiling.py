@@ -0,0 +1,188 @@
+import os
+import io
+import time
+import pstats
+import shutil
+import tempfile
+import cProfile
+import logging
+import threading
+from datetime import datetime
+
+import pipeline
+import rawnet
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# ON-DEMAND PROFILING
+# ==========================
+# Runs a single prediction under cProfile, the PyTorch profiler and the
+# TensorFlow profiler, and writes everything to DFG_PROFILE_DIR/<run id>/
+# (default: <tmp>/dfg-profiles; only the newest DFG_PROFILE_KEEP runs are kept):
+#   cprofile.pstats     Python profile (snakeviz, flameprof, pstats)
+#   cprofile.collapsed  folded stacks for flamegraph.pl / speedscope
+#   torch_stacks.txt    folded PyTorch op stacks (self CPU time, microseconds)
+#   tensorflow/         TF trace, viewable in TensorBoard's profile plugin
+# Nothing here runs unless a profile is explicitly requested. The
+# near-duplicate cache is bypassed, so a profile always covers the models.
+
+PROFILE_DIR = os.getenv("DFG_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "dfg-profiles"))
+PROFILE_KEEP = int(os.getenv("DFG_PROFILE_KEEP", "20"))
+
+# Only one profile at a time: the TF profiler is process-global.
+profile_lock = threading.Lock()
+
+
+def _key(function):
+    code = function.__code__
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+STAGES = {
+    "pipeline": _key(pipeline.DetectionPipeline.__call__),
+    "face_detection": _key(pipeline.DetectionPipeline.detect_faces),
+    "face_inference": _key(pipeline._predict_faces),
+    "audio_inference": _key(rawnet.RawNet.forward),
+}
+
+
+def stage_breakdown(stats, total):
+    """Seconds spent in each DetectionPipeline stage, from cumulative cProfile times."""
+    cumulative = {name: stats.stats[key][3] if key in stats.stats else 0.0 for name, key in STAGES.items()}
+    stages = {
+        # DetectionPipeline.__call__ minus the face detection it calls: decoding, resizing, resampling.
+        "decode_and_preprocess": max(cumulative["pipeline"] - cumulative["face_detection"], 0.0),
+        "face_detection": cumulative["face_detection"],
+        "face_inference": cumulative["face_inference"],
+        "audio_inference": cumulative["audio_inference"],
+    }
+    stages["other"] = max(total - sum(stages.values()), 0.0)
+    return {name: round(seconds, 6) for name, seconds in stages.items()}
+
+
+def _label(key):
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def write_collapsed_stacks(stats, root, path, min_seconds=1e-4, max_depth=64):
+    """Approximate folded stacks from cProfile's caller graph.
+
+    cProfile only records caller->callee edges, so each callee's time is split
+    between its callers in proportion to the time spent under each edge.
+    """
+    callees = {}
+    for callee, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((callee, edge[3]))
+
+    lines = []
+
+    def walk(key, share, path):
+        tt, ct = stats.stats[key][2], stats.stats[key][3]
+        if ct <= 0:
+            return
+        path = path + [key]
+        self_seconds = tt * share
+        if self_seconds >= min_seconds:
+            lines.append(f"{';'.join(_label(k) for k in path)} {int(self_seconds * 1e6)}")
+        if len(path) >= max_depth:
+            return
+        for callee, edge_ct in callees.get(key, []):
+            if callee in path or callee not in stats.stats:
+                continue  # recursion is folded into the first occurrence
+            callee_share = share * edge_ct / stats.stats[callee][3] if stats.stats[callee][3] else 0.0
+            if stats.stats[callee][3] * callee_share >= min_seconds:
+                walk(callee, callee_share, path)
+
+    if root in stats.stats:
+        walk(root, 1.0, [])
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def prune_profiles(keep=PROFILE_KEEP):
+    """Delete all but the newest `keep` run directories (run ids sort by time)."""
+    try:
+        runs = sorted(name for name in os.listdir(PROFILE_DIR) if os.path.isdir(os.path.join(PROFILE_DIR, name)))
+    except FileNotFoundError:
+        return
+    for name in runs[:max(len(runs) - keep, 0)]:
+        shutil.rmtree(os.path.join(PROFILE_DIR, name), ignore_errors=True)
+
+
+def profile_prediction(modality, predict_fn, file_path, top=30):
+    """Run predict_fn(file_path) under all available profilers and return a report dict."""
+    if not profile_lock.acquire(blocking=False):
+        raise RuntimeError("Another profile is already running")
+    try:
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{modality}"
+        out_dir = os.path.abspath(os.path.join(PROFILE_DIR, run_id))
+        os.makedirs(out_dir, exist_ok=True)
+
+        torch_profiler = None
+        try:
+            import torch.profiler
+            torch_profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], with_stack=True)
+        except Exception as e:
+            logger.warning(f"PyTorch profiler unavailable: {str(e)}")
+        tf_logdir = os.path.join(out_dir, "tensorflow")
+        tf_started = False
+        try:
+            pipeline.tf.profiler.experimental.start(tf_logdir)
+            tf_started = True
+        except Exception as e:
+            logger.warning(f"TensorFlow profiler unavailable: {str(e)}")
+
+        profiler = cProfile.Profile()
+        result, error = None, None
+        if torch_profiler is not None:
+            torch_profiler.__enter__()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            with pipeline.known_media_bypassed():
+                result = predict_fn(file_path)
+        except Exception as e:
+            error = str(e)
+        finally:
+            profiler.disable()
+            total = time.perf_counter() - started
+            if torch_profiler is not None:
+                torch_profiler.__exit__(None, None, None)
+            if tf_started:
+                pipeline.tf.profiler.experimental.stop()
+
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(os.path.join(out_dir, "cprofile.pstats"))
+        write_collapsed_stacks(stats, _key(predict_fn), os.path.join(out_dir, "cprofile.collapsed"))
+        files = ["cprofile.pstats", "cprofile.collapsed"]
+        if torch_profiler is not None:
+            torch_profiler.export_stacks(os.path.join(out_dir, "torch_stacks.txt"), "self_cpu_time_total")
+            files.append("torch_stacks.txt")
+        if tf_started:
+            files.append("tensorflow/")
+
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+        report = {
+            "run_id": run_id,
+            "modality": modality,
+            "total_seconds": round(total, 6),
+            "stages": stage_breakdown(stats, total),
+            "result": result,
+            "error": error,
+            "output_dir": out_dir,
+            "files": files,
+            "top_functions": text.getvalue(),
+        }
+        if torch_profiler is not None:
+            report["torch_ops"] = torch_profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=top)
+        logger.info(f"Profile {run_id}: {total:.3f}s, stages {report['stages']}")
+        prune_profiles()
+        return report
+    finally:
+        profile_lock.release()
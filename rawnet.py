@@ -361,3 +361,139 @@ class RawNet(nn.Module):
                 if summary[layer]["trainable"] == True:
                     trainable_params += summary[layer]["nb_params"]
             print_fn(line_new)
+
+
+def _residual_prepool(block, x):
+    # Residual_block.forward without the final max-pool (bn1 is unused there too).
+    identity = x
+    out = block.conv1(x)
+    out = block.bn2(out)
+    out = block.lrelu(out)
+    out = block.conv2(out)
+    if block.downsample:
+        identity = block.conv_downsample(identity)
+    return out + identity
+
+
+class StreamingRawNet:
+    """Chunk-by-chunk inference with a trained RawNet, emitting a score after every chunk.
+
+    State carried between chunks:
+      - the last kernel_size-1 samples for the SincConv front end,
+      - samples left over before each stride-3 max-pool,
+      - the last input frames of every residual block (each block's two
+        3-tap convs look two frames ahead, so its last two outputs are held
+        back until the next chunk arrives),
+      - running sums for each block's attention, which in RawNet averages
+        over the whole clip,
+      - the GRU hidden state.
+
+    Everything except the attention is exactly what the full model computes.
+    The attention uses the average over the audio seen so far, so scores
+    converge to the full-clip result as more audio arrives. Call flush() at
+    the end of a stream to score the held-back frames, and reset() before
+    starting a new one.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.blocks = [model.block0[0], model.block1[0], model.block2[0],
+                       model.block3[0], model.block4[0], model.block5[0]]
+        self.attentions = [model.fc_attention0, model.fc_attention1, model.fc_attention2,
+                           model.fc_attention3, model.fc_attention4, model.fc_attention5]
+        # The sinc filters are fixed, so build them once instead of on every forward.
+        sinc = model.Sinc_conv
+        with torch.no_grad():
+            sinc(torch.zeros(1, 1, sinc.kernel_size, device=model.device))
+        self.filters = sinc.filters.detach().clone()
+        self.kernel_size = sinc.kernel_size
+        self.reset()
+
+    def reset(self):
+        self.sample_tail = None
+        self.pool_rest = [None] * (len(self.blocks) + 1)
+        self.block_ctx = [None] * len(self.blocks)
+        self.block_emitted = [0] * len(self.blocks)
+        self.attention_sum = [None] * len(self.blocks)
+        self.attention_count = [0] * len(self.blocks)
+        self.hidden = None
+        self.output = None
+
+    def _pool(self, i, x):
+        if self.pool_rest[i] is not None:
+            x = torch.cat([self.pool_rest[i], x], dim=-1)
+        n = x.shape[-1] // 3 * 3
+        self.pool_rest[i] = x[..., n:]
+        return F.max_pool1d(x[..., :n], 3) if n else x[..., :0]
+
+    def _block(self, i, x, final=False):
+        ctx, emitted = self.block_ctx[i], self.block_emitted[i]
+        buf = x if ctx is None else torch.cat([ctx, x], dim=-1)
+        if final:
+            # End of stream: the convs' right zero-padding applies, as in the full model.
+            self.block_ctx[i], self.block_emitted[i] = None, 0
+            return _residual_prepool(self.blocks[i], buf)[..., emitted:] if buf.shape[-1] else buf
+        end = buf.shape[-1] - 2
+        if end <= emitted:
+            self.block_ctx[i] = buf
+            return buf[..., :0]
+        out = _residual_prepool(self.blocks[i], buf)[..., emitted:end]
+        keep = max(end - 2, 0)
+        self.block_ctx[i] = buf[..., keep:]
+        self.block_emitted[i] = end - keep
+        return out
+
+    def _attend(self, i, x):
+        total = x.sum(dim=-1)
+        if self.attention_sum[i] is not None:
+            total = total + self.attention_sum[i]
+        self.attention_sum[i] = total
+        self.attention_count[i] += x.shape[-1]
+        y = self.model.sig(self.attentions[i](total / self.attention_count[i])).unsqueeze(-1)
+        return x * y + y
+
+    def _blocks_and_gru(self, x, final=False):
+        model = self.model
+        for i in range(len(self.blocks)):
+            x = self._pool(i + 1, self._block(i, x, final))
+            if x.shape[-1]:
+                x = self._attend(i, x)
+            elif not final:
+                return self.output
+        if x.shape[-1] == 0:
+            return self.output
+        x = model.selu(model.bn_before_gru(x))
+        x, self.hidden = model.gru(x.permute(0, 2, 1), self.hidden)
+        x = model.fc2_gru(model.fc1_gru(x[:, -1, :]))
+        self.output = model.logsoftmax(x)
+        return self.output
+
+    def __call__(self, chunk):
+        """Feed a (batch, samples) chunk; returns the current log-softmax scores, or None if no frame is complete yet."""
+        model = self.model
+        x = chunk.view(chunk.shape[0], 1, -1)
+        if self.sample_tail is not None:
+            x = torch.cat([self.sample_tail, x], dim=-1)
+        if x.shape[-1] < self.kernel_size:
+            self.sample_tail = x
+            return self.output
+        self.sample_tail = x[..., x.shape[-1] - self.kernel_size + 1:]
+
+        x = F.conv1d(x, self.filters)
+        x = self._pool(0, torch.abs(x))
+        if x.shape[-1]:
+            x = model.selu(model.first_bn(x))
+        return self._blocks_and_gru(x)
+
+    def flush(self):
+        """End the stream: score the frames each block held back and return the final scores.
+
+        With a constant attention this matches RawNet.forward on the whole clip.
+        """
+        if self.sample_tail is None:
+            return self.output
+        x = self.sample_tail.new_zeros(self.sample_tail.shape[0], self.filters.shape[0], 0)
+        output = self._blocks_and_gru(x, final=True)
+        self.sample_tail = None
+        self.pool_rest = [None] * (len(self.blocks) + 1)
+        return output
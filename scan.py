@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import queue as queue_module
+import multiprocessing as mp
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("scan")
+
+# ==========================
+# OFFLINE BULK SCANNER
+# ==========================
+# Walks a directory (or reads a manifest of paths), shards the files across
+# worker processes and streams one JSON line per file to the output as soon
+# as it is scored. Re-running with the same output file skips everything
+# already scored there and retries files that failed, so an interrupted scan
+# can simply be restarted.
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+AUDIO_EXTENSIONS = {".flac", ".wav", ".mp3", ".m4a"}
+
+
+def detect_modality(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in VIDEO_EXTENSIONS:
+        return "video"
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in AUDIO_EXTENSIONS:
+        return "audio"
+    return None
+
+
+def collect_inputs(source):
+    """Yield absolute media file paths from a directory tree or a manifest file (one path per line).
+
+    Paths are absolute so a resumed scan matches the recorded ones however
+    the source was spelled and wherever the scan is run from.
+    """
+    if os.path.isdir(source):
+        for root, _, files in os.walk(os.path.abspath(source)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if detect_modality(path):
+                    yield path
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                path = line.strip()
+                if not path or path.startswith("#"):
+                    continue
+                path = os.path.normpath(os.path.join(base, path))
+                if detect_modality(path):
+                    yield path
+
+
+def load_completed(output_path):
+    """Return the set of paths already scored successfully in a (possibly truncated) JSONL output file.
+
+    Records with an "error" are dropped from the file so those files are
+    retried, and a partially written last line left by an interruption is
+    cut off, so new records are appended after the last complete one.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    kept, retried, truncated = [], 0, False
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                truncated = True
+                break
+            try:
+                record = json.loads(line)
+                path = record["path"]
+            except (ValueError, KeyError):
+                truncated = True
+                break
+            if "error" in record:
+                retried += 1
+                continue
+            done.add(os.path.abspath(path))
+            kept.append(line)
+    if truncated:
+        logger.warning(f"Dropping incomplete record at end of {output_path}")
+    if retried:
+        logger.info(f"Retrying {retried} files that failed in a previous run")
+    if truncated or retried:
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(kept)
+        os.replace(tmp_path, output_path)
+    return done
+
+
+def _score_batch(modality, paths, batch_size):
+    import pipeline
+
+    if modality == "image":
+        return pipeline.deepfakes_image_predict_batch(paths, batch_size=batch_size)
+    if modality == "audio":
+        return pipeline.deepfakes_audio_predict_batch(paths, batch_size=batch_size)
+    results = []
+    for path in paths:
+        try:
+            results.append(pipeline.deepfakes_video_predict(path))
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+
+def scan_worker(paths, batch_size, queue):
+    """Score one shard of files, grouped by modality, and push each record onto the queue."""
+    by_modality = {}
+    for path in paths:
+        by_modality.setdefault(detect_modality(path), []).append(path)
+
+    for modality, files in by_modality.items():
+        for start in range(0, len(files), batch_size):
+            chunk = files[start:start + batch_size]
+            started = time.perf_counter()
+            try:
+                results = _score_batch(modality, chunk, batch_size)
+            except Exception as e:
+                results = [{"error": str(e)}] * len(chunk)
+            elapsed = (time.perf_counter() - started) / len(chunk)
+            for path, result in zip(chunk, results):
+                record = {"path": path, "modality": modality, "seconds": round(elapsed, 4)}
+                record.update(result)
+                queue.put(record)
+    queue.put(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a directory or manifest of media files for deepfakes.")
+    parser.add_argument("source", help="Directory to walk, or a manifest file with one path per line.")
+    parser.add_argument("-o", "--output", default="scan_results.jsonl", help="JSONL file to write (appended on resume).")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("-b", "--batch-size", type=int, default=16, help="Files per model call for images and audio.")
+    args = parser.parse_args()
+
+    done = load_completed(args.output)
+    pending = [path for path in collect_inputs(args.source) if path not in done]
+    if done:
+        logger.info(f"Resuming: {len(done)} files already scanned")
+    if not pending:
+        logger.info("Nothing to scan")
+        return 0
+
+    workers = max(1, min(args.workers, len(pending)))
+    logger.info(f"Scanning {len(pending)} files with {workers} workers")
+
+    # Workers import the models themselves; spawn keeps TF/PyTorch state out of the parent.
+    # WEB_CONCURRENCY splits the CPUs between them (see thread_budget.py).
+    os.environ.setdefault("WEB_CONCURRENCY", str(workers))
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue(maxsize=1024)
+    procs = [
+        ctx.Process(target=scan_worker, args=(pending[i::workers], args.batch_size, queue), daemon=True)
+        for i in range(workers)
+    ]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+
+    scanned = errors = 0
+    finished = 0
+    with open(args.output, "a") as out:
+        while finished < workers:
+            try:
+                record = queue.get(timeout=5)
+            except queue_module.Empty:
+                # A worker killed without its end marker (e.g. OOM) must not hang the scan.
+                if not any(proc.is_alive() for proc in procs):
+                    logger.error("Workers exited early; re-run to resume the remaining files")
+                    break
+                continue
+            if record is None:
+                finished += 1
+                continue
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            scanned += 1
+            errors += "error" in record
+            if scanned % 100 == 0:
+                logger.info(f"{scanned}/{len(pending)} files scanned")
+
+    for proc in procs:
+        proc.join()
+
+    elapsed = time.perf_counter() - started
+    rate = scanned / elapsed if elapsed > 0 else 0.0
+    print(f"Scanned {scanned} files ({errors} errors) in {elapsed:.1f}s: {rate:.2f} files/sec")
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
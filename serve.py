@@ -0,0 +1,198 @@
+import os
+import time
+import sys
+import errno
+import signal
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+
+import uvicorn
+
+import thread_budget
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("serve")
+
+# ==========================
+# PRE-FORK SERVER
+# ==========================
+# The master only binds the socket and supervises workers; it never imports
+# `app`. Loading a Keras model or a PyTorch checkpoint already runs ops and
+# starts framework threads, and TensorFlow cannot be used in a child forked
+# after that. Each worker therefore imports `app` (and thus `pipeline`) itself.
+#
+# Only the RawNet weights are shared between workers: its checkpoint is loaded
+# with torch.load(mmap=True), so its tensors are views of the file's pages in
+# the OS page cache. The TensorFlow runtime, EfficientNet (and the cascade
+# screener) and MTCNN are still held once per worker, so adding workers
+# still costs their memory each time. Use the periodic memory report to see
+# a real worker's unique memory.
+
+# Exit code of a worker that could not load the application (missing model
+# files, bad configuration). Restarting it would only fail again.
+STARTUP_FAILED = 3
+
+
+def read_memory_kb(pid):
+    """Return {'rss', 'pss', 'uss'} in kB for a process, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def log_memory(pids):
+    total_uss = 0
+    for index, pid in sorted(pids.items(), key=lambda item: item[1]):
+        try:
+            mem = read_memory_kb(pid)
+        except OSError:
+            continue
+        total_uss += mem["uss"]
+        logger.info(
+            f"worker {index} (pid {pid}): rss={mem['rss'] // 1024} MB "
+            f"pss={mem['pss'] // 1024} MB unique={mem['uss'] // 1024} MB"
+        )
+    try:
+        master = read_memory_kb(os.getpid())
+        logger.info(
+            f"master (pid {os.getpid()}): rss={master['rss'] // 1024} MB, "
+            f"workers unique total={total_uss // 1024} MB"
+        )
+    except OSError:
+        pass
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, index, args):
+    # Reset signal handlers inherited from the master so uvicorn can install its own.
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logger.info(f"worker {index} started (pid {os.getpid()})")
+    # Read by feed_api: only worker 0 runs the feed prescorer.
+    os.environ["DFG_WORKER_INDEX"] = str(index)
+    if args.pin_workers:
+        cpus = sorted(os.sched_getaffinity(0))
+        share = max(1, len(cpus) // args.workers)
+        start = (index * share) % len(cpus)
+        thread_budget.set_affinity(set(cpus[start:start + share]))
+        # The slice already is this worker's share; without this, thread_budget()
+        # would divide it by WEB_CONCURRENCY a second time.
+        os.environ.setdefault("DFG_THREADS", str(share))
+    try:
+        from app import app as application
+    except BaseException:
+        logger.exception(f"worker {index} failed to load the application")
+        return STARTUP_FAILED
+    config = uvicorn.Config(application, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return 0
+
+
+def spawn_worker(sock, index, args):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            code = run_worker(sock, index, args)
+        except BaseException:
+            logger.exception(f"worker {index} crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Deepfake Guard with pre-forked uvicorn workers on one socket.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--pin-workers", action="store_true",
+                        help="Pin each worker to its own slice of the usable CPUs.")
+    parser.add_argument("--memory-report-interval", type=float, default=60.0,
+                        help="Seconds between per-worker memory reports (0 disables).")
+    args = parser.parse_args()
+
+    # Each worker gets an equal share of the CPUs (see thread_budget.py).
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    # Worker 0 publishes feed verdicts here for the other workers (see feed_scorer.py).
+    os.environ.setdefault("FEED_PRESCORE_STORE", os.path.join(tempfile.gettempdir(), f"dfg-feed-{args.port}"))
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers")
+
+    pids = {}
+    for index in range(args.workers):
+        pids[index] = spawn_worker(sock, index, args)
+
+    stopping = threading.Event()
+    failed = threading.Event()
+
+    def shutdown(signum, frame):
+        stopping.set()
+        for pid in list(pids.values()):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    if args.memory_report_interval > 0:
+        def report_loop():
+            while not stopping.wait(args.memory_report_interval):
+                log_memory(pids)
+        threading.Thread(target=report_loop, daemon=True).start()
+
+    while pids:
+        try:
+            pid, status = os.wait()
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            if e.errno == errno.ECHILD:
+                break
+            raise
+        index = next((i for i, p in pids.items() if p == pid), None)
+        if index is None:
+            continue
+        del pids[index]
+        if os.waitstatus_to_exitcode(status) == STARTUP_FAILED and not stopping.is_set():
+            logger.error(f"worker {index} could not load the application, shutting down")
+            failed.set()
+            shutdown(None, None)
+        if not stopping.is_set():
+            logger.warning(f"worker {index} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(1)
+            pids[index] = spawn_worker(sock, index, args)
+
+    sock.close()
+    logger.info("All workers stopped")
+    return 1 if failed.is_set() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import cv2
+import numpy as np
+import pytest
+
+from phash_index import CHUNK_SHIFTS, CHUNK_WIDTHS, PerceptualIndex, _popcount64, image_phash
+
+FAKE = {"result": "FAKE", "confidence": 91.5}
+REAL = {"result": "REAL", "confidence": 87.25}
+
+
+@pytest.fixture
+def make_index(tmp_path):
+    def make(**kwargs):
+        # Saves and reloads are driven by the tests, not the background thread.
+        kwargs.setdefault("autosave_every", 10 ** 6)
+        kwargs.setdefault("refresh_interval", 3600)
+        return PerceptualIndex(str(tmp_path / "index"), **kwargs)
+    return make
+
+
+def flip(h, bits):
+    for bit in bits:
+        h ^= 1 << bit
+    return h
+
+
+def random_hashes(n, seed):
+    return np.random.default_rng(seed).integers(0, 2 ** 63, n, dtype=np.uint64)
+
+
+def test_lookup_before_and_after_save(make_index):
+    index = make_index()
+    hashes = random_hashes(4, seed=1)
+    index.add("video", hashes, FAKE)
+    assert index.lookup("video", hashes) == FAKE
+
+    index.save()
+    assert index._pending_items == []
+    assert index.lookup("video", hashes) == FAKE
+    assert index.lookup("image", hashes) is None
+    assert make_index().lookup("video", hashes) == FAKE
+
+
+def test_entries_added_during_save_keep_their_owner(make_index):
+    index = make_index()
+    first, second, third = random_hashes(3, seed=2), random_hashes(3, seed=3), random_hashes(3, seed=4)
+    index.add("video", first, FAKE)
+    index.add("video", second, {"result": "FAKE", "confidence": 60.0})
+
+    read = index._read
+    calls = []
+
+    def read_and_add():
+        # The first read inside save() is the merge; add while it runs.
+        if not calls:
+            index.add("video", third, {"result": "FAKE", "confidence": 75.0})
+        calls.append(1)
+        return read()
+
+    index._read = read_and_add
+    index.save()
+    index._read = read
+
+    assert len(index._items) == 2
+    assert index._pending_owners == [0, 0, 0]
+    assert index.lookup("video", first) == FAKE
+    assert index.lookup("video", second)["confidence"] == 60.0
+    assert index.lookup("video", third)["confidence"] == 75.0
+
+    index.save()
+    assert len(index._items) == 3
+    assert index.lookup("video", third)["confidence"] == 75.0
+
+
+def test_match_spread_across_all_chunks(make_index):
+    index = make_index()
+    # Fill the tables so probes hit many runs of the sorted chunk arrays.
+    noise = random_hashes(5000, seed=5)
+    noise[1::2] = noise[::2] ^ np.uint64(1)
+    index.add("image", noise, {"result": "FAKE", "confidence": 1.0})
+    target = 0x5A5A_1234_ABCD_0F0F
+    index.add("image", np.array([target], dtype=np.uint64), FAKE)
+    index.save()
+
+    # 3 + 3 + 2 flipped bits: only the last chunk is within the probe radius.
+    query = flip(target, [CHUNK_SHIFTS[0] + 1, CHUNK_SHIFTS[0] + 5, CHUNK_SHIFTS[0] + 9,
+                          CHUNK_SHIFTS[1] + 2, CHUNK_SHIFTS[1] + 7, CHUNK_SHIFTS[1] + 11,
+                          CHUNK_SHIFTS[2] + 3, CHUNK_SHIFTS[2] + CHUNK_WIDTHS[2] - 1])
+    assert index.lookup("image", [query]) == FAKE
+    assert index.lookup("image", [flip(query, [CHUNK_SHIFTS[2]])]) is None
+
+    rng = np.random.default_rng(6)
+    for h in noise[rng.choice(len(noise), 50)]:
+        query = np.uint64(flip(int(h), rng.choice(64, 6, replace=False).tolist()))
+        ids, distances = index._candidates(query)
+        brute = np.flatnonzero(_popcount64(index._hashes ^ query) <= index.max_distance)
+        assert sorted(set(ids.tolist())) == brute.tolist()  # an id can be found through several chunks
+        assert (distances == _popcount64(index._hashes[ids] ^ query)).all()
+
+
+def test_two_writers_merge(make_index):
+    a, b = make_index(), make_index()
+    from_a, from_b = random_hashes(3, seed=7), random_hashes(3, seed=8)
+    a.add("audio", from_a, FAKE)
+    b.add("audio", from_b, {"result": "FAKE", "confidence": 55.0})
+    a.save()
+    b.save()
+
+    a._refresh()
+    for index in (a, b, make_index()):
+        assert len(index) == 2
+        assert index.lookup("audio", from_a) == FAKE
+        assert index.lookup("audio", from_b)["confidence"] == 55.0
+
+
+def test_real_verdict_needs_near_exact_match(make_index):
+    rng = np.random.default_rng(0)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (256, 256)).astype(np.uint8), (0, 0), 12)
+    frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX)
+    reencoded = cv2.imdecode(cv2.imencode(".jpg", cv2.resize(frame, (200, 200)), [cv2.IMWRITE_JPEG_QUALITY, 60])[1], 0)
+    swapped = frame.copy()
+    swapped[100:164, 110:174] = 255 - swapped[100:164, 110:174]  # stand-in for a swapped face
+
+    original = [image_phash(frame)]
+    distance = bin(original[0] ^ image_phash(swapped)).count("1")
+    assert 2 < distance <= 8
+
+    index = make_index()
+    index.add("image", original, REAL)
+    assert index.lookup("image", [image_phash(reencoded)]) == REAL
+    assert index.lookup("image", [image_phash(swapped)]) is None
+
+    index = make_index()
+    index.add("image", original, FAKE)
+    assert index.lookup("image", [image_phash(swapped)]) == FAKE
@@ -0,0 +1,68 @@
+import torch
+
+from rawnet import RawNet, StreamingRawNet
+
+
+def small_rawnet(seed=0):
+    torch.manual_seed(seed)
+    d_args = {
+        "nb_samp": 24000,
+        "first_conv": 129,
+        "in_channels": 1,
+        "filts": [8, [8, 8], [8, 16], [16, 16]],
+        "blocks": [2, 4],
+        "nb_fc_node": 32,
+        "gru_node": 32,
+        "nb_gru_layer": 2,
+        "nb_classes": 2,
+    }
+    model = RawNet(d_args=d_args, device="cpu")
+    with torch.no_grad():
+        for bn in [model.first_bn, model.bn_before_gru] + [m for m in model.modules() if isinstance(m, torch.nn.BatchNorm1d)]:
+            bn.running_mean.uniform_(-0.1, 0.1)
+            bn.running_var.uniform_(0.5, 1.5)
+    return model.eval()
+
+
+def hold_attention_constant(model):
+    # Zero weights make each attention gate sigmoid(bias), independent of the
+    # clip average, so streaming and full-clip inference must agree exactly.
+    with torch.no_grad():
+        for fc in [model.fc_attention0, model.fc_attention1, model.fc_attention2,
+                   model.fc_attention3, model.fc_attention4, model.fc_attention5]:
+            fc[0].weight.zero_()
+            fc[0].bias.uniform_(-2, 2)
+
+
+def stream(model, audio, chunk_sizes):
+    streaming = StreamingRawNet(model)
+    start, i = 0, 0
+    with torch.no_grad():
+        while start < audio.shape[1]:
+            size = chunk_sizes[i % len(chunk_sizes)]
+            streaming(audio[:, start:start + size])
+            start += size
+            i += 1
+        return streaming.flush()
+
+
+def test_flush_matches_full_forward_with_constant_attention():
+    model = small_rawnet()
+    hold_attention_constant(model)
+    audio = torch.randn(2, 24000) * 0.1
+    with torch.no_grad():
+        expected = model(audio.clone())
+
+    for chunk_sizes in ([24000], [1600], [97, 1234, 5000, 13]):
+        torch.testing.assert_close(stream(model, audio, chunk_sizes), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_chunking_does_not_change_streaming_scores():
+    model = small_rawnet(seed=1)
+    audio = torch.randn(1, 24000) * 0.1
+    single = stream(model, audio, [24000])
+    torch.testing.assert_close(stream(model, audio, [777, 3001]), single, rtol=1e-4, atol=1e-5)
+
+
+def test_flush_without_audio_returns_none():
+    assert StreamingRawNet(small_rawnet()).flush() is None
@@ -0,0 +1,73 @@
+import json
+import os
+
+from scan import collect_inputs, load_completed
+
+
+def write_lines(path, lines):
+    with open(path, "wb") as f:
+        f.write(b"".join(lines))
+
+
+def record(path, **fields):
+    return (json.dumps(dict(path=path, **fields)) + "\n").encode()
+
+
+def test_missing_output_is_empty(tmp_path):
+    assert load_completed(str(tmp_path / "out.jsonl")) == set()
+
+
+def test_truncated_tail_is_cut_off(tmp_path):
+    out = tmp_path / "out.jsonl"
+    a, b = str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")
+    write_lines(out, [record(a, result="REAL"), record(b, result="FAKE")[:-7]])
+
+    assert load_completed(str(out)) == {a}
+    assert out.read_bytes() == record(a, result="REAL")
+    assert not os.path.exists(str(out) + ".tmp")
+
+
+def test_error_records_are_dropped_for_retry(tmp_path):
+    out = tmp_path / "out.jsonl"
+    a, b, c = (str(tmp_path / name) for name in ("a.jpg", "b.mp4", "c.wav"))
+    write_lines(out, [record(a, result="REAL"), record(b, error="decode failed"), record(c, result="FAKE")])
+
+    assert load_completed(str(out)) == {a, c}
+    assert out.read_bytes() == record(a, result="REAL") + record(c, result="FAKE")
+    assert not os.path.exists(str(out) + ".tmp")
+
+
+def test_clean_file_is_left_untouched(tmp_path):
+    out = tmp_path / "out.jsonl"
+    a = str(tmp_path / "a.jpg")
+    write_lines(out, [record(a, result="REAL")])
+    before = os.stat(out).st_ino
+
+    assert load_completed(str(out)) == {a}
+    assert os.stat(out).st_ino == before
+
+
+def test_rewrite_replaces_file_atomically(tmp_path):
+    out = tmp_path / "out.jsonl"
+    a = str(tmp_path / "a.jpg")
+    write_lines(out, [record(a, result="REAL"), b'{"path": "b.j'])
+    before = os.stat(out).st_ino
+
+    load_completed(str(out))
+    # os.replace swaps in a new inode instead of truncating the file in place.
+    assert os.stat(out).st_ino != before
+    assert os.listdir(tmp_path) == ["out.jsonl"]
+
+
+def test_inputs_are_absolute_however_spelled(tmp_path, monkeypatch):
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "a.jpg").write_bytes(b"")
+    (media / "notes.txt").write_bytes(b"")
+    (tmp_path / "list.txt").write_text("media/a.jpg\n# comment\n./media/../media/a.jpg\n")
+    monkeypatch.chdir(tmp_path)
+
+    expected = str(media / "a.jpg")
+    assert list(collect_inputs("media")) == [expected]
+    assert list(collect_inputs("./media/")) == [expected]
+    assert list(collect_inputs("list.txt")) == [expected, expected]
@@ -0,0 +1,154 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CPU THREAD BUDGET
+# ==========================
+# TensorFlow, PyTorch, OpenCV and the BLAS libraries under NumPy each size
+# their own thread pool to the whole machine by default. With several
+# workers per node (and several requests per worker) that oversubscribes the
+# CPUs many times over. This module derives one per-worker budget and applies
+# it to all of them.
+#
+#   DFG_THREADS          threads per worker (default: usable CPUs // WEB_CONCURRENCY);
+#                        0 turns the budget off and leaves every library at its default
+#   DFG_INTER_OP_THREADS TF/PyTorch inter-op pool size (default: 1)
+#   DFG_CPU_AFFINITY     optional CPU list to pin this process to, e.g. "0-3,8"
+#
+# configure_env() must run before NumPy/OpenCV/PyTorch are imported (BLAS
+# reads its env vars at load time); configure_frameworks() must run before
+# TensorFlow or PyTorch execute anything.
+
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+_frameworks = {}
+
+
+def parse_cpu_list(spec):
+    """Parse a CPU list such as "0-3,8,10-11" into a set of ints."""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def usable_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def budget_enabled():
+    return os.getenv("DFG_THREADS", "").strip() != "0"
+
+
+def thread_budget():
+    """Threads per worker, or None when the budget is turned off (DFG_THREADS=0)."""
+    if not budget_enabled():
+        return None
+    if os.getenv("DFG_THREADS"):
+        return max(1, int(os.environ["DFG_THREADS"]))
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, usable_cpus() // workers)
+
+
+def inter_op_threads():
+    if not budget_enabled():
+        return None
+    return max(1, int(os.getenv("DFG_INTER_OP_THREADS", "1")))
+
+
+def set_affinity(cpus):
+    """Pin the calling process (and threads it creates afterwards) to the given CPUs."""
+    try:
+        os.sched_setaffinity(0, cpus)
+        logger.info(f"Pinned pid {os.getpid()} to CPUs {sorted(cpus)}")
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Could not set CPU affinity {sorted(cpus)}: {str(e)}")
+
+
+def configure_env():
+    """Apply affinity and BLAS/OpenMP thread env vars. Explicitly set env vars are left alone."""
+    if os.getenv("DFG_CPU_AFFINITY"):
+        set_affinity(parse_cpu_list(os.environ["DFG_CPU_AFFINITY"]))
+    if not budget_enabled():
+        return
+    budget = str(thread_budget())
+    for name in BLAS_ENV_VARS:
+        os.environ.setdefault(name, budget)
+
+
+def configure_frameworks(tf=None, torch=None, cv2=None):
+    """Size TensorFlow, PyTorch and OpenCV thread pools to the per-worker budget."""
+    if not budget_enabled():
+        # Only remembered for effective_settings(); every pool keeps its default size.
+        _frameworks.update({name: module for name, module in (("tensorflow", tf), ("torch", torch), ("cv2", cv2))
+                            if module is not None})
+        logger.info("Thread budget disabled (DFG_THREADS=0): framework defaults in effect")
+        return
+    budget, inter = thread_budget(), inter_op_threads()
+    if tf is not None:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(budget)
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+        except RuntimeError as e:
+            logger.warning(f"TensorFlow threads already initialized: {str(e)}")
+        _frameworks["tensorflow"] = tf
+    if torch is not None:
+        torch.set_num_threads(budget)
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError as e:
+            logger.warning(f"PyTorch inter-op threads already initialized: {str(e)}")
+        _frameworks["torch"] = torch
+    if cv2 is not None:
+        cv2.setNumThreads(budget)
+        _frameworks["cv2"] = cv2
+    logger.info(f"Thread budget: {budget} intra-op / {inter} inter-op threads per worker")
+
+
+def effective_settings():
+    """Report the thread settings actually in effect in this process."""
+    settings = {
+        "pid": os.getpid(),
+        "budget": thread_budget(),
+        "inter_op": inter_op_threads(),
+        "usable_cpus": usable_cpus(),
+        "env": {name: os.getenv(name) for name in BLAS_ENV_VARS},
+    }
+    try:
+        settings["affinity"] = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        settings["affinity"] = None
+    try:
+        settings["process_threads"] = len(os.listdir("/proc/self/task"))
+    except OSError:
+        settings["process_threads"] = None
+    if "tensorflow" in _frameworks:
+        threading = _frameworks["tensorflow"].config.threading
+        settings["tensorflow"] = {
+            "intra_op": threading.get_intra_op_parallelism_threads(),
+            "inter_op": threading.get_inter_op_parallelism_threads(),
+        }
+    if "torch" in _frameworks:
+        torch = _frameworks["torch"]
+        settings["torch"] = {"intra_op": torch.get_num_threads(), "inter_op": torch.get_num_interop_threads()}
+    if "cv2" in _frameworks:
+        settings["opencv"] = {"threads": _frameworks["cv2"].getNumThreads()}
+    return settings
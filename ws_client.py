@@ -0,0 +1,66 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import cv2
+import websockets
+
+# ==========================
+# LIVE STREAM TEST CLIENT
+# ==========================
+# Replays a video file frame by frame over /ws/predict/video and prints each
+# rolling verdict the server pushes back.
+
+
+async def replay(args):
+    url = f"{args.url}?sample_every={args.sample_every}&window={args.window}"
+    v_cap = cv2.VideoCapture(args.video)
+    if not v_cap.isOpened():
+        raise SystemExit(f"Failed to open video: {args.video}")
+    fps = v_cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_interval = 0 if args.fast else 1.0 / fps
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(args.token)  # the first text message authenticates the stream
+
+        async def receive():
+            async for message in ws:
+                print(json.dumps(json.loads(message)))
+
+        receiver = asyncio.create_task(receive())
+        started = time.perf_counter()
+        sent = 0
+        while True:
+            success, frame = v_cap.read()
+            if not success:
+                break
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+            if not ok:
+                continue
+            await ws.send(encoded.tobytes())
+            sent += 1
+            delay = started + sent * frame_interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        v_cap.release()
+        await ws.send("end")
+        await receiver
+        print(f"Sent {sent} frames in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a video file to the live deepfake scoring WebSocket.")
+    parser.add_argument("video")
+    parser.add_argument("--url", default="ws://localhost:8000/ws/predict/video")
+    parser.add_argument("--token", required=True, help="Firebase ID token.")
+    parser.add_argument("--sample-every", type=int, default=5)
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of the sent frames.")
+    parser.add_argument("--fast", action="store_true", help="Send frames as fast as possible instead of at the video's frame rate.")
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()